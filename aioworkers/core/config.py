@@ -361,6 +361,7 @@ extractors = {
     'get_bool': BooleanValueMatcher.fn,
     'get_duration': humanize.parse_duration,
     'get_size': humanize.parse_size,
+    'get_rate': humanize.parse_rate,
     'get_url': URL,
     'get_path': Path,
     'get_obj': utils.import_name,
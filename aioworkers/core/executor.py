@@ -0,0 +1,124 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class PriorityThreadPoolExecutor(Executor):
+    """ Thread pool which runs pending calls in order of priority,
+    lower value is more urgent. Calls of equal priority run FIFO.
+    Collects queue depth and wait time of calls.
+    """
+    default_priority = PRIORITY_NORMAL
+
+    def __init__(self, max_workers=None, thread_name_prefix=''):
+        if max_workers is None:
+            max_workers = (os.cpu_count() or 1) * 5
+        if max_workers <= 0:
+            raise ValueError('max_workers must be greater than 0')
+        self._max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix or (
+            'PriorityThreadPoolExecutor-{}'.format(id(self)))
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = set()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_priority(
+            self.default_priority, fn, *args, **kwargs)
+
+    def submit_priority(self, priority, fn, *args, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError(
+                    'cannot schedule new futures after shutdown')
+            f = Future()
+            self._queue.put((
+                priority, next(self._counter), time.monotonic(),
+                f, fn, args, kwargs,
+            ))
+            if len(self._threads) < self._max_workers:
+                t = threading.Thread(
+                    name='{}_{}'.format(
+                        self._thread_name_prefix, len(self._threads)),
+                    target=self._worker,
+                    daemon=True,
+                )
+                t.start()
+                self._threads.add(t)
+        return f
+
+    def with_priority(self, priority):
+        return PriorityExecutor(self, priority)
+
+    def _worker(self):
+        while True:
+            _, _, submitted, f, fn, args, kwargs = self._queue.get()
+            if f is None:
+                return
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self._calls += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            if not f.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                f.set_exception(e)
+            else:
+                f.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            for _ in self._threads:
+                self._queue.put((
+                    float('inf'), next(self._counter), None,
+                    None, None, None, None,
+                ))
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def status(self):
+        with self._lock:
+            calls = self._calls
+            return {
+                'workers': len(self._threads),
+                'max_workers': self._max_workers,
+                'queue': self._queue.qsize(),
+                'calls': calls,
+                'wait_avg': self._wait_total / calls if calls else 0.0,
+                'wait_max': self._wait_max,
+            }
+
+
+class PriorityExecutor(Executor):
+    """ View of PriorityThreadPoolExecutor submitting with fixed priority
+    """
+
+    def __init__(self, executor, priority):
+        self._executor = executor
+        self._priority = priority
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit_priority(
+            self._priority, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
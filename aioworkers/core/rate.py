@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import fcntl
+import os
+import struct
+import time
+
+from ..utils import shm_path
+
+
+class TokenBucket:
+    """ Rate limit with burst. Tokens are refilled by rate per second
+    up to burst. Taken tokens may go below zero,
+    then taker waits until its tokens are refilled,
+    so takers are served in order without queue of waiters.
+
+    >>> bucket = TokenBucket(2, burst=2, clock=lambda: 0)
+    >>> bucket.reserve(), bucket.reserve(), bucket.reserve()
+    (0, 0, 0.5)
+    >>> bucket.reserve(now=0.25)
+    0.75
+    >>> bucket.refund(5); bucket.reserve(now=0.25)
+    0
+    """
+
+    def __init__(self, rate, burst=1, *, clock=time.monotonic, loop=None):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._loop = loop
+        self._tokens = burst
+        self._last = clock()
+
+    def _refill(self, now):
+        if now > self._last:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    @contextlib.contextmanager
+    def _state(self):
+        yield
+
+    def reserve(self, tokens=1, now=None):
+        """ Takes tokens, returns seconds until they are refilled """
+        with self._state():
+            self._refill(self._clock() if now is None else now)
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def refund(self, tokens=1):
+        """ Returns taken tokens, bucket keeps up to burst """
+        with self._state():
+            self._refill(self._clock())
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+    async def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay, loop=self._loop)
+            except asyncio.CancelledError:
+                self.refund(tokens)
+                raise
+
+    def close(self):
+        pass
+
+
+class SharedTokenBucket(TokenBucket):
+    """ Token bucket in file shared by processes of host """
+    STATE = struct.Struct('<dd')  # tokens, last
+
+    def __init__(self, rate, burst=1, *, path, loop=None):
+        super().__init__(rate, burst, clock=time.time, loop=loop)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    @contextlib.contextmanager
+    def _state(self):
+        fd = self._fd
+        if fd is None:
+            raise RuntimeError('Token bucket is closed')
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            data = os.pread(fd, self.STATE.size, 0)
+            if len(data) == self.STATE.size:
+                self._tokens, self._last = self.STATE.unpack(data)
+            yield
+            os.pwrite(fd, self.STATE.pack(self._tokens, self._last), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def refund(self, tokens=1):
+        """ Does nothing after close, e.g. for cancelled acquire """
+        if self._fd is not None:
+            super().refund(tokens)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def token_bucket(config, loop=None):
+    """ Returns bucket by config keys rate, burst and rate_shared
+    or None without rate """
+    rate = config.get_rate('rate', default=None, null=True)
+    if rate is None:
+        return None
+    elif rate <= 0:
+        raise ValueError('Rate must be positive: {}'.format(config.rate))
+    burst = config.get_int('burst', default=1)
+    shared = config.get('rate_shared')
+    if not shared:
+        return TokenBucket(rate, burst, loop=loop)
+    path = os.path.join(shm_path(), shared + '.rate')
+    return SharedTokenBucket(rate, burst, path=path, loop=loop)
@@ -0,0 +1,141 @@
+import math
+from typing import Dict, Hashable, List, Optional, Set
+
+
+class TimerWheel:
+    """ Hierarchical timing wheel of deadlines.
+    Add and remove are O(1), advance costs O(1) per tick
+    and per cascaded key instead of O(log n) per key of a heap.
+    Key is placed on the level of the highest tick digit
+    which differs from current tick, so it cascades to lower levels
+    while time comes closer to its deadline.
+
+    >>> w = TimerWheel(resolution=1, now=0)
+    >>> w.add('a', 3); w.add('b', 70); w.add('c', 5000)
+    >>> w.advance(2), w.advance(3), w.advance(69)
+    ([], ['a'], [])
+    >>> w.remove('c'), len(w)
+    (5000, 1)
+    >>> w.advance(100)
+    ['b']
+    """
+
+    def __init__(
+        self, resolution: float = 1, slots: int = 64,
+        levels: int = 4, now: float = 0,
+    ):
+        self.resolution = resolution
+        self._slots = slots
+        self._levels = levels
+        self._tick = self._to_tick(now, math.floor)
+        self._wheels = [
+            [set() for _ in range(slots)] for _ in range(levels)
+        ]  # type: List[List[Set[Hashable]]]
+        self._overflow = set()  # type: Set[Hashable]
+        self._due = set()  # type: Set[Hashable]
+        self._deadlines = {}  # type: Dict[Hashable, float]
+        self._ticks = {}  # type: Dict[Hashable, int]
+        self._where = {}  # type: Dict[Hashable, Set[Hashable]]
+
+    def _to_tick(self, t: float, rounding=math.ceil) -> int:
+        return int(rounding(t / self.resolution))
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def get(self, key) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def items(self):
+        return self._deadlines.items()
+
+    def _place(self, key, tick: int):
+        if tick <= self._tick:
+            bucket = self._due
+        else:
+            slots = self._slots
+            current = self._tick
+            for level in range(self._levels):
+                if tick // slots == current // slots:
+                    bucket = self._wheels[level][tick % slots]
+                    break
+                tick //= slots
+                current //= slots
+            else:
+                bucket = self._overflow
+        bucket.add(key)
+        self._where[key] = bucket
+
+    def add(self, key, deadline: float):
+        if key in self._deadlines:
+            self.remove(key)
+        tick = self._to_tick(deadline)
+        self._deadlines[key] = deadline
+        self._ticks[key] = tick
+        self._place(key, tick)
+
+    def remove(self, key) -> Optional[float]:
+        """ Returns deadline of removed key """
+        if key not in self._deadlines:
+            return None
+        self._where.pop(key).discard(key)
+        del self._ticks[key]
+        return self._deadlines.pop(key)
+
+    def _pop(self, bucket: set, expired: list):
+        for key in bucket:
+            del self._where[key]
+            del self._ticks[key]
+            del self._deadlines[key]
+            expired.append(key)
+        bucket.clear()
+
+    def _cascade(self, bucket: set):
+        keys = list(bucket)
+        bucket.clear()
+        for key in keys:
+            self._place(key, self._ticks[key])
+
+    def _step(self, expired: list):
+        self._tick += 1
+        tick = self._tick
+        slots = self._slots
+        span = slots ** self._levels
+        if tick % span == 0:
+            self._cascade(self._overflow)
+        for level in range(self._levels - 1, 0, -1):
+            span //= slots
+            if tick % span == 0:
+                self._cascade(self._wheels[level][tick // span % slots])
+        self._pop(self._wheels[0][tick % slots], expired)
+        self._pop(self._due, expired)
+
+    def _rebuild(self, tick: int, expired: list):
+        self._tick = tick
+        for wheel in self._wheels:
+            for bucket in wheel:
+                bucket.clear()
+        self._overflow.clear()
+        self._due.clear()
+        for key, t in self._ticks.items():
+            self._place(key, t)
+        self._pop(self._due, expired)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """ Moves time to now, returns keys which deadline is passed """
+        expired = []  # type: List[Hashable]
+        self._pop(self._due, expired)
+        target = self._to_tick(now, math.floor)
+        if target <= self._tick:
+            return expired
+        elif not self._deadlines:
+            self._tick = target
+        elif target - self._tick > max(len(self._deadlines), self._slots):
+            self._rebuild(target, expired)
+        else:
+            while self._tick < target:
+                self._step(expired)
+        return expired
@@ -94,3 +94,24 @@ def parse_duration(value):
         else:
             raise ValueError(value)
     return result
+
+
+def parse_rate(value):
+    """ Returns count per second
+    >>> parse_rate('100/s')
+    100.0
+    >>> parse_rate('30/m')
+    0.5
+    >>> parse_rate('10/2s')
+    5.0
+    >>> parse_rate('4')
+    4.0
+    """
+    if isinstance(value, (int, float)):
+        return value
+    count, sep, duration = value.partition('/')
+    if not sep:
+        return float(count)
+    elif duration.isalpha():
+        duration = '1' + duration
+    return float(count) / parse_duration(duration)
@@ -52,8 +52,11 @@ class Response:
     def headers(self):
         return self._response.headers
 
-    async def read(self) -> bytes:
-        return await self._session.run(self._response.read)
+    async def read(self, size: Optional[int] = None) -> bytes:
+        return await self._session.run(self._response.read, size)
+
+    def iter_chunks(self, size: int = 1 << 16) -> 'ResponseChunks':
+        return ResponseChunks(self, size)
 
     def isclosed(self):
         return self._response.isclosed()
@@ -62,6 +65,21 @@ class Response:
         return await self._session.run(self._response.close)
 
 
+class ResponseChunks:
+    def __init__(self, response: Response, size: int):
+        self._response = response
+        self._size = size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        result = await self._response.read(self._size)
+        if not result:
+            raise StopAsyncIteration()
+        return result
+
+
 class Session:
     def __init__(
         self,
@@ -1,11 +1,100 @@
 import asyncio
+import collections
+from abc import abstractmethod
+from functools import partial
 
 from ..core.base import AbstractReader, AbstractWriter
 from ..utils import import_name
 
 
+async def _get_ready(loop, get) -> list:
+    """ Returns list with item if get finishes without waiting """
+    task = asyncio.ensure_future(get(), loop=loop)
+    try:
+        await asyncio.sleep(0, loop=loop)
+    finally:
+        if not task.done():
+            task.cancel()
+    if not task.done():
+        await asyncio.wait([task], loop=loop)
+    if task.cancelled():
+        return []
+    return [task.result()]
+
+
+async def collect(loop, get, max_items: int, timeout=None,
+                  restore=None) -> list:
+    """ Waits first item, then collects up to max_items
+    which are ready or got within timeout from first item.
+    When it is cancelled, collected items are passed to restore """
+    items = [await get()]
+    deadline = loop.time() + (timeout or 0)
+    try:
+        while len(items) < max_items:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                ready = await _get_ready(loop, get)
+                if not ready:
+                    break
+                items += ready
+                continue
+            try:
+                items.append(await asyncio.wait_for(
+                    get(), remaining, loop=loop))
+            except asyncio.TimeoutError:
+                break
+    except asyncio.CancelledError:
+        if restore is not None:
+            restore(items)
+        raise
+    return items
+
+
 class AbstractQueue(AbstractReader, AbstractWriter):
-    pass
+    def get_many(self, max_items: int, timeout=None):
+        return collect(
+            self.loop, self.get, max_items, timeout, self._put_back)
+
+    def _put_back(self, items):
+        """ Puts back items got by cancelled get_many """
+        self.loop.create_task(self.put_many(items))
+
+    async def put_many(self, items):
+        for item in items:
+            await self.put(item)
+
+
+class AbstractAckQueue(AbstractQueue):
+    """ Reserved value stays in queue until it is acknowledged.
+    reserve returns tag and value, ack removes value by tag
+    and nack returns it to queue. get acknowledges at once.
+    """
+
+    @abstractmethod  # pragma: no cover
+    async def reserve(self):
+        raise NotImplementedError()
+
+    @abstractmethod  # pragma: no cover
+    async def ack(self, tag):
+        raise NotImplementedError()
+
+    @abstractmethod  # pragma: no cover
+    async def nack(self, tag):
+        raise NotImplementedError()
+
+    def reserve_many(self, max_items: int, timeout=None):
+        """ Returns list of (tag, value) """
+        return collect(
+            self.loop, self.reserve, max_items, timeout, self._nack_many)
+
+    def _nack_many(self, items):
+        for tag, value in items:
+            self.loop.create_task(self.nack(tag))
+
+    async def get(self):
+        tag, value = await self.reserve()
+        await self.ack(tag)
+        return value
 
 
 class Queue(asyncio.Queue, AbstractQueue):
@@ -17,6 +106,45 @@ class Queue(asyncio.Queue, AbstractQueue):
     def __len__(self):
         return len(self._queue)
 
+    async def get_many(self, max_items: int, timeout=None) -> list:
+        """ Waits first item, then takes items which are in queue
+        and waits up to timeout for the rest of max_items.
+        Items are kept as they are stored, so cancelled call
+        returns them to queue """
+        get = partial(asyncio.Queue.get, self)
+        items = [await get()]
+        deadline = self.loop.time() + (timeout or 0)
+        try:
+            while len(items) < max_items:
+                if not self.empty():
+                    items.append(self.get_nowait())
+                    continue
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(
+                        get(), remaining, loop=self.loop))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            self._put_back(items)
+            raise
+        return [self._value(i) for i in items]
+
+    def _value(self, item):
+        return item
+
+    def _put_back(self, items):
+        """ Returns stored items to head of queue over maxsize """
+        if isinstance(self._queue, collections.deque):
+            self._queue.extendleft(reversed(items))
+        else:
+            for item in items:
+                self._put(item)
+        for _ in items:
+            self._wakeup_next(self._getters)
+
 
 class PriorityQueue(asyncio.PriorityQueue, Queue):
     def __init__(self, config, *, context=None, loop=None):
@@ -52,6 +180,9 @@ class ScoreQueueMixin:
         else:
             return val
 
+    def _value(self, item):
+        return item[1]
+
 
 def score_queue(default_score=None):
     return lambda klass: type(
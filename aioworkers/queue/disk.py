@@ -0,0 +1,394 @@
+import asyncio
+import bisect
+import collections
+import os
+import struct
+import zlib
+
+from ..core.base import ExecutorEntity
+from ..core.formatter import FormattedEntity
+from ..storage.filesystem import fsync_path
+from .base import AbstractAckQueue
+
+__all__ = (
+    'DiskQueue',
+)
+
+RECORD = struct.Struct('<IIQ')  # size, crc32, id
+ACK = struct.Struct('<Q')
+
+
+def read_segment(path):
+    """ Returns list of (id, data) and offset after last valid record """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records = []
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        size, crc, id = RECORD.unpack_from(data, offset)
+        start = offset + RECORD.size
+        payload = data[start:start + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            break
+        records.append((id, payload))
+        offset = start + size
+    return records, offset
+
+
+def read_acks(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return set()
+    count = len(data) // ACK.size
+    return set(struct.unpack_from('<{}Q'.format(count), data))
+
+
+class Commit(asyncio.Future):
+    """ Future of batch of writes shared by its puts and acks.
+    Cancelled waiter does not cancel batch,
+    it gets CancelledError when batch is written """
+
+    def cancel(self, *args, **kwargs):
+        return False
+
+
+class DiskQueue(FormattedEntity, ExecutorEntity, AbstractAckQueue):
+    """ Durable queue in append only segment files.
+    put returns when value is written with values of concurrent puts.
+    Reserved value stays in segment until it is acknowledged,
+    ids of acknowledged values are appended to ack file of segment.
+    At start values which are not acknowledged are read back,
+    so values reserved before crash are delivered again.
+    Segment is removed when all its values are acknowledged.
+    Waiting values are kept in memory too.
+    Nacked value is delivered again after delay, which is doubled
+    by every next nack of it, so failing value does not hold the head.
+    config:
+        path: str directory of segments
+        format: default pickle
+        maxsize: int limit of values in queue and reserved,
+            default unlimited
+        segment_size: int or str size of segment to rotate, default 64M
+        sync: bool fsync every batch of writes, default true
+        commit_window: duration of collecting batch, default 0
+        redelivery_delay: duration before nacked value is ready,
+            default 0.1
+        redelivery_max_delay: duration, default 60
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._ready = collections.deque()
+        self._reserved = {}
+        self._getters = collections.deque()
+        self._putters = collections.deque()
+        self._segments = []
+        self._live = {}
+        self._records = []
+        self._acks = []
+        self._reclaim = []
+        self._count = 0
+        self._next_id = 0
+        self._pending = None
+        self._running = None
+        self._group = None
+        self._nacks = {}
+        self._delayed = {}
+        self._active = None
+        self._segment_fd = None
+        self._segment_bytes = 0
+        self.counter = collections.Counter()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config.new_parent(format='pickle', executor=1))
+        self._path = self.config.path
+        self._maxsize = self.config.get_int('maxsize', default=0)
+        self._segment_size = self.config.get_size(
+            'segment_size', default='64M')
+        self._sync = self.config.get_bool('sync', default=True)
+        self._window = self.config.get_duration(
+            'commit_window', default=0)
+        self._redelivery_delay = self.config.get_duration(
+            'redelivery_delay', default=0.1)
+        self._redelivery_max_delay = self.config.get_duration(
+            'redelivery_max_delay', default=60)
+
+    async def init(self):
+        await super().init()
+        ready, self._segments, self._live, self._next_id = \
+            await self.run_in_executor(self._recover)
+        self._ready.extend(ready)
+        self._count = len(ready)
+        self.context.on_stop.append(self.stop)
+
+    async def stop(self):
+        if self._pending is not None:
+            await asyncio.wait([self._pending], loop=self.loop)
+        elif self._running is not None:
+            await asyncio.wait([self._running], loop=self.loop)
+        for waiter in self._getters:
+            waiter.cancel()
+        self._getters.clear()
+        for handle in self._delayed.values():
+            handle.cancel()  # values are read back at start
+        self._delayed.clear()
+        await self.run_in_executor(self._close)
+
+    def __len__(self):
+        return len(self._ready)
+
+    def _segment_path(self, start, suffix='.seg'):
+        return os.path.join(self._path, '{:020d}{}'.format(start, suffix))
+
+    def _open(self, start):
+        self._active = start
+        self._segment_fd = open(self._segment_path(start), 'ab')
+        self._segment_bytes = self._segment_fd.tell()
+
+    def _close(self):
+        if self._segment_fd is not None:
+            self._segment_fd.close()
+            self._segment_fd = None
+
+    def _recover(self):
+        os.makedirs(self._path, exist_ok=True)
+        starts = sorted(
+            int(name[:-4]) for name in os.listdir(self._path)
+            if name.endswith('.seg'))
+        ready = []
+        segments = []
+        live = {}
+        next_id = starts[-1] if starts else 0
+        for start in starts:
+            path = self._segment_path(start)
+            records, end = read_segment(path)
+            if end < os.path.getsize(path):
+                with open(path, 'r+b') as f:  # torn write at crash
+                    f.truncate(end)
+            acked = read_acks(self._segment_path(start, '.ack'))
+            count = 0
+            for id, data in records:
+                next_id = max(next_id, id + 1)
+                if id not in acked:
+                    ready.append((id, data))
+                    count += 1
+            if count or start == starts[-1]:
+                segments.append(start)
+                live[start] = count
+            else:
+                self._unlink(start)
+        if not segments:
+            segments.append(next_id)
+            live[next_id] = 0
+        self._open(segments[-1])
+        return ready, segments, live, next_id
+
+    def _unlink(self, start):
+        for suffix in ('.seg', '.ack'):
+            try:
+                os.unlink(self._segment_path(start, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, records, acks, reclaim):
+        """ Returns list of [segment, count of records] """
+        placed = []
+        to_sync = []
+        rotated = []
+        if self._segment_fd is None:  # put after stop
+            self._open(self._active)
+        fd = self._segment_fd
+        for id, data in records:
+            if self._segment_bytes >= self._segment_size:
+                fd.flush()
+                rotated.append(fd)
+                self._open(id)
+                fd = self._segment_fd
+            buf = RECORD.pack(len(data), zlib.crc32(data), id)
+            fd.write(buf)
+            fd.write(data)
+            self._segment_bytes += len(buf) + len(data)
+            if placed and placed[-1][0] == self._active:
+                placed[-1][1] += 1
+            else:
+                placed.append([self._active, 1])
+        if records:
+            fd.flush()
+            to_sync.append(fd)
+        for start, ids in acks.items():
+            path = self._segment_path(start, '.ack')
+            with open(path, 'ab') as f:
+                f.write(struct.pack('<{}Q'.format(len(ids)), *ids))
+                f.flush()
+                if self._sync:
+                    os.fsync(f.fileno())
+        if self._sync:
+            for f in rotated + to_sync:
+                os.fsync(f.fileno())
+            if rotated:
+                fsync_path(self._path)
+        for f in rotated:
+            f.close()
+        for start in reclaim:
+            self._unlink(start)
+        return placed
+
+    def _commit(self):
+        """ Returns future of batch which is written next """
+        if self._pending is None:
+            self._group = Commit(loop=self.loop)
+            self._pending = self.loop.create_task(
+                self._flush(self._running, self._group))
+        return self._group
+
+    async def _flush(self, previous, group):
+        if previous is not None:
+            await asyncio.wait([previous], loop=self.loop)
+        if self._window:
+            await asyncio.sleep(self._window, loop=self.loop)
+        try:
+            await self._write_batch()
+        except Exception as e:
+            group.set_exception(e)
+        else:
+            group.set_result(None)
+
+    async def _write_batch(self):
+        records, self._records = self._records, []
+        acks = {}
+        for start, id in self._acks:
+            acks.setdefault(start, []).append(id)
+        self._acks = []
+        reclaim, self._reclaim = self._reclaim, []
+        self._running, self._pending = self._pending, None
+        placed = await self.run_in_executor(
+            self._write, records, acks, reclaim)
+        for start, count in placed:
+            last = self._segments[-1]
+            if start != last:
+                if not self._live[last]:
+                    self._release(last)
+                self._segments.append(start)
+                self._live[start] = 0
+            self._live[start] += count
+        self._ready.extend(records)
+        self.counter['put'] += len(records)
+        self.counter['batches'] += 1
+        self._wake(self._getters, len(records))
+
+    def _release(self, start):
+        self._segments.remove(start)
+        del self._live[start]
+        self._reclaim.append(start)
+
+    def _wake(self, waiters, count=None):
+        while waiters and (count is None or count > 0):
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if count is not None:
+                    count -= 1
+
+    async def _wait(self, waiters):
+        waiter = self.loop.create_future()
+        waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._wake(waiters, 1)
+            raise
+
+    async def put(self, value):
+        await self.put_many([value])
+
+    async def put_many(self, items):
+        """ Writes values with one commit """
+        items = [self.encode(i) for i in items]
+        while self._maxsize and self._count and \
+                self._count + len(items) > self._maxsize:
+            await self._wait(self._putters)
+        for data in items:
+            self._records.append((self._next_id, data))
+            self._next_id += 1
+        self._count += len(items)
+        await self._commit()
+
+    def _reserve(self):
+        id, data = self._ready.popleft()
+        self._reserved[id] = data
+        return id, self.decode(data)
+
+    async def reserve(self):
+        while not self._ready:
+            await self._wait(self._getters)
+        return self._reserve()
+
+    async def reserve_many(self, max_items: int, timeout=None):
+        """ Waits first value, then takes ready values
+        and waits up to timeout for the rest of max_items """
+        items = [await self.reserve()]
+        deadline = self.loop.time() + (timeout or 0)
+        try:
+            while len(items) < max_items:
+                if self._ready:
+                    items.append(self._reserve())
+                    continue
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(
+                        self.reserve(), remaining, loop=self.loop))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            for tag, value in reversed(items):
+                self._ready.appendleft((tag, self._reserved.pop(tag)))
+            self._wake(self._getters, len(items))
+            raise
+        return items
+
+    async def ack(self, tag):
+        self._reserved.pop(tag)
+        self._nacks.pop(tag, None)
+        segments = self._segments
+        start = segments[bisect.bisect_right(segments, tag) - 1]
+        self._live[start] -= 1
+        self._acks.append((start, tag))
+        if not self._live[start] and start != segments[-1]:
+            self._release(start)
+        self._count -= 1
+        self.counter['ack'] += 1
+        self._wake(self._putters)
+        await self._commit()
+
+    async def nack(self, tag):
+        """ Returns reserved value to head of queue after delay """
+        data = self._reserved.pop(tag)
+        self.counter['nack'] += 1
+        nacks = self._nacks[tag] = self._nacks.get(tag, 0) + 1
+        delay = min(
+            self._redelivery_delay * 2 ** min(nacks - 1, 32),
+            self._redelivery_max_delay)
+        if delay > 0:
+            self._delayed[tag] = self.loop.call_later(
+                delay, self._redeliver, tag, data)
+        else:
+            self._redeliver(tag, data)
+
+    def _redeliver(self, tag, data):
+        self._delayed.pop(tag, None)
+        self._ready.appendleft((tag, data))
+        self._wake(self._getters, 1)
+
+    async def status(self):
+        return {
+            'ready': len(self._ready),
+            'reserved': len(self._reserved),
+            'delayed': len(self._delayed),
+            'segments': len(self._segments),
+            **self.counter,
+        }
@@ -0,0 +1,128 @@
+import collections
+import zlib
+
+from ..core.base import AbstractNestedEntity, AbstractWriter
+from ..utils import import_name
+from .base import Queue
+
+__all__ = (
+    'BroadcastQueue',
+    'PartitionQueue',
+)
+
+
+class FanOut(AbstractNestedEntity, AbstractWriter):
+    """ Writer to sub queues, which are got by path like queue.name
+    or by index of child in Supervisor with attach.
+    config:
+        child: mapping config of sub queue with cls,
+            default Queue with maxsize of this config
+    """
+    item_factory = Queue  # type: ignore
+
+    def _set_loop(self, loop):
+        super()._set_loop(loop)
+        for i in self._children.values():
+            i._set_loop(loop)
+
+    async def put_many(self, items):
+        for item in items:
+            await self.put(item)
+
+
+class BroadcastQueue(FanOut):
+    """ Every subscriber gets every value.
+    Subscribers are sub queues, subscriber attached
+    after values are put gets only next values.
+    config:
+        subscribers: int count or list of names of subscribers,
+            other names are rejected, without it sub queue is created
+            by any name
+        maxsize: int size of buffer of subscriber
+        policy: str for full buffer of subscriber
+            block: put waits for space, default
+            drop_new: value is not put to this subscriber
+            drop_old: oldest value of subscriber is dropped
+    """
+    policies = ('block', 'drop_new', 'drop_old')
+    _fixed = False
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._maxsize = self.config.get_int('maxsize', default=0)
+        self._policy = self.config.get('policy', 'block')
+        if self._policy not in self.policies:
+            raise ValueError('Unknown policy {}'.format(self._policy))
+        self.dropped = collections.Counter()
+        subscribers = self.config.get('subscribers', ())
+        if isinstance(subscribers, int):
+            subscribers = range(subscribers)
+        for name in subscribers:
+            self.factory(str(name))
+        self._fixed = bool(subscribers)
+
+    def factory(self, item, config=None):
+        if self._fixed and item not in self._children:
+            raise KeyError('Unknown subscriber {}'.format(item))
+        return super().factory(item, config)
+
+    def __getattr__(self, item):
+        try:
+            return super().__getattr__(item)
+        except KeyError as e:
+            raise AttributeError(item) from e
+
+    async def put(self, value):
+        maxsize = self._maxsize
+        for name, sub in list(self._children.items()):
+            if self._policy == 'block' or not maxsize:
+                pass
+            elif len(sub) >= maxsize:
+                self.dropped[name] += 1
+                if self._policy == 'drop_new':
+                    continue
+                await sub.get()
+            await sub.put(value)
+
+    async def status(self):
+        return {
+            name: {'size': len(sub), 'dropped': self.dropped[name]}
+            for name, sub in self._children.items()
+        }
+
+
+class PartitionQueue(FanOut):
+    """ Value is put to one of partitions by hash of its key,
+    so values with equal keys are got from the same partition in order.
+    Partitions are sub queues with names from 0.
+    config:
+        partitions: int count of partitions
+        key: str.path to function of value which returns key,
+            default value is key
+        maxsize: int size of partition
+    """
+    _key = None
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._partitions = self.config.get_int('partitions')
+        key = self.config.get('key')
+        if key:
+            self._key = import_name(key)
+        for i in range(self._partitions):
+            self.factory(str(i))
+
+    def partition(self, key) -> int:
+        """ Index of partition by crc32, it is the same in all processes
+        unlike hash of str """
+        if not isinstance(key, bytes):
+            key = str(key).encode()
+        return zlib.crc32(key) % self._partitions
+
+    def put(self, value, key=None):
+        if key is None:
+            key = value if self._key is None else self._key(value)
+        return self[str(self.partition(key))].put(value)
+
+    async def status(self):
+        return {name: len(sub) for name, sub in self._children.items()}
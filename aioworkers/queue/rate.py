@@ -0,0 +1,55 @@
+from ..core.rate import token_bucket
+from .base import AbstractQueue
+
+__all__ = (
+    'RateQueue',
+)
+
+
+class RateQueue(AbstractQueue):
+    """ Gets values of other queue not faster than rate
+    config:
+        queue: str.path to instance of AbstractQueue
+        rate: rate of get, like 100/s or 5/m
+        burst: int count of gets over rate after idle, default 1
+        rate_shared: str name of rate shared by processes of host
+    """
+    _bucket = None
+
+    async def init(self):
+        await super().init()
+        self._bucket = token_bucket(self.config, loop=self.loop)
+        self.context.on_stop.append(self.stop)
+
+    async def stop(self):
+        if self._bucket is not None:
+            self._bucket.close()
+
+    @property
+    def queue(self):
+        return self.context[self.config.queue]
+
+    def __len__(self):
+        return len(self.queue)
+
+    async def get(self):
+        if self._bucket is not None:
+            await self._bucket.acquire()
+        return await self.queue.get()
+
+    async def get_many(self, max_items: int, timeout=None):
+        """ Waits token of first value, tokens of other values got
+        are taken without wait, so next get waits for them """
+        if self._bucket is None:
+            return await self.queue.get_many(max_items, timeout)
+        await self._bucket.acquire()
+        items = await self.queue.get_many(max_items, timeout)
+        if len(items) > 1:
+            self._bucket.reserve(len(items) - 1)
+        return items
+
+    def put(self, value):
+        return self.queue.put(value)
+
+    def put_many(self, items):
+        return self.queue.put_many(items)
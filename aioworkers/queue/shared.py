@@ -0,0 +1,287 @@
+import asyncio
+import collections
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+
+from ..core.formatter import FormattedEntity
+from ..utils import shm_path
+from .base import AbstractQueue
+
+__all__ = (
+    'SharedQueue',
+)
+
+MAGIC = b'AIOWRING'
+HEADER = struct.Struct('<8sQQQQ')  # magic, capacity, head, tail, count
+LENGTH = struct.Struct('<I')
+
+
+class SharedQueue(FormattedEntity, AbstractQueue):
+    """ Queue in ring buffer of shared memory for processes on one host.
+    Processes attach to the same buffer by name, so entity
+    configured for processes from config processes: is one queue.
+    Buffer is memory mapped file, it is locked by flock.
+    Every attached queue reads own named pipes of put and get,
+    which other queues of buffer write to after put and get,
+    waiting processes also check buffer every poll interval.
+    Buffer outlives processes, values left in it are got after restart.
+    config:
+        name: str name of buffer, default path of entity in config
+        path: str directory of buffer, default /dev/shm
+        size: int or str size of buffer in bytes, default 1M
+        format: default pickle
+        poll: duration of checking buffer while waiting, default 0.1
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._fd = None
+        self._mmap = None
+        self._notify = {}
+        self._peers = {'get': {}, 'put': {}}
+        self._peers_mtime = None
+        self._getters = collections.deque()
+        self._putters = collections.deque()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config.new_parent(format='pickle'))
+        path = self.config.get('path') or shm_path()
+        self._file = os.path.join(
+            path, self.config.get('name') or self.config.name)
+        self._size = self.config.get_size('size', default='1M')
+        self._poll = self.config.get_duration('poll', default=0.1)
+
+    async def init(self):
+        await super().init()
+        self.open()
+        self.context.on_stop.append(self.stop)
+
+    def open(self):
+        if self._fd is not None:
+            return
+        fd = os.open(self._file + '.ring', os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if not os.fstat(fd).st_size:
+                os.ftruncate(fd, HEADER.size + self._size)
+                os.pwrite(fd, HEADER.pack(MAGIC, self._size, 0, 0, 0), 0)
+            magic, capacity, *_ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        if magic != MAGIC:
+            os.close(fd)
+            raise ValueError('{}.ring is not a queue'.format(self._file))
+        self._fd = fd
+        self._capacity = capacity
+        self._mmap = mmap.mmap(fd, HEADER.size + capacity)
+        for kind, waiters in (('get', self._getters), ('put', self._putters)):
+            self._notify[kind] = self._open_fifo(kind, waiters)
+
+    def _fifo_prefix(self, kind):
+        return '{}.{}.'.format(os.path.basename(self._file), kind)
+
+    def _open_fifo(self, kind, waiters):
+        """ Returns path and fd of own pipe of this queue """
+        path = '{}.{}.{}-{}'.format(self._file, kind, os.getpid(), id(self))
+        try:
+            os.mkfifo(path, 0o600)
+        except FileExistsError:
+            pass
+        # read and write end, so open does not wait for other processes
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self.loop.add_reader(fd, self._on_notify, fd, waiters)
+        return path, fd
+
+    async def stop(self):
+        for path, fd in self._notify.values():
+            self.loop.remove_reader(fd)
+            os.close(fd)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._notify.clear()
+        for peers in self._peers.values():
+            for fd in peers.values():
+                os.close(fd)
+            peers.clear()
+        self._peers_mtime = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _on_notify(self, fd, waiters):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._wake(waiters)
+
+    def _signal(self, kind):
+        """ Writes to pipes of other queues of buffer """
+        self._refresh_peers()
+        peers = self._peers[kind]
+        for path, fd in list(peers.items()):
+            try:
+                os.write(fd, b'\0')
+            except BlockingIOError:
+                pass  # pipe is full, reader is notified already
+            except OSError:  # reader is gone
+                os.close(peers.pop(path))
+                self._remove_stale(path)
+
+    def _refresh_peers(self):
+        """ Opens pipes of queues attached since last call,
+        which is known by mtime of directory """
+        directory = os.path.dirname(self._file)
+        mtime = os.stat(directory).st_mtime_ns
+        if mtime == self._peers_mtime:
+            return
+        self._peers_mtime = mtime
+        names = os.listdir(directory)
+        for kind, peers in self._peers.items():
+            prefix = self._fifo_prefix(kind)
+            paths = {
+                os.path.join(directory, name) for name in names
+                if name.startswith(prefix)
+            }
+            paths.discard(self._notify[kind][0])
+            for path in set(peers) - paths:
+                os.close(peers.pop(path))
+            for path in paths - set(peers):
+                try:
+                    peers[path] = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+                except OSError:
+                    self._remove_stale(path)
+
+    def _remove_stale(self, path):
+        """ Removes pipe of dead process,
+        pipe of live process is opened by next signal """
+        pid = os.path.basename(path).rsplit('.', 1)[-1].split('-')[0]
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            return
+        except (OSError, ValueError):
+            pass
+        self._peers_mtime = None
+
+    def _wake(self, waiters):
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _wait(self, waiters):
+        waiter = self.loop.create_future()
+        waiters.append(waiter)
+        await asyncio.wait([waiter], timeout=self._poll, loop=self.loop)
+        if not waiter.done():
+            waiter.cancel()
+            waiters.remove(waiter)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            _, _, head, tail, count = HEADER.unpack_from(self._mmap)
+            state = [head, tail, count]
+            yield state
+            if state != [head, tail, count]:
+                HEADER.pack_into(
+                    self._mmap, 0, MAGIC, self._capacity, *state)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _copy_in(self, pos, data):
+        offset = pos % self._capacity
+        first = min(len(data), self._capacity - offset)
+        start = HEADER.size + offset
+        self._mmap[start:start + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self._mmap[HEADER.size:HEADER.size + rest] = data[first:]
+
+    def _copy_out(self, pos, size):
+        offset = pos % self._capacity
+        first = min(size, self._capacity - offset)
+        start = HEADER.size + offset
+        data = self._mmap[start:start + first]
+        if first < size:
+            data += self._mmap[HEADER.size:HEADER.size + size - first]
+        return data
+
+    def _record(self, value):
+        data = self.encode(value)
+        record = LENGTH.pack(len(data)) + data
+        if len(record) > self._capacity:
+            raise ValueError('Value is larger than queue')
+        return record
+
+    def put_nowait(self, value):
+        """ Returns False when buffer has no space for value """
+        return self._put(self._record(value))
+
+    def _put(self, record):
+        with self._locked() as state:
+            head, tail, count = state
+            if tail - head + len(record) > self._capacity:
+                return False
+            self._copy_in(tail, record)
+            state[1] += len(record)
+            state[2] += 1
+        self._wake(self._getters)
+        self._signal('get')
+        return True
+
+    def get_nowait(self):
+        """ Raises asyncio.QueueEmpty when buffer is empty """
+        with self._locked() as state:
+            head, tail, count = state
+            if head == tail:
+                raise asyncio.QueueEmpty()
+            size, = LENGTH.unpack(self._copy_out(head, LENGTH.size))
+            data = self._copy_out(head + LENGTH.size, size)
+            if count == 1:
+                state[:] = 0, 0, 0
+            else:
+                state[0] += LENGTH.size + size
+                state[2] -= 1
+        self._wake(self._putters)
+        self._signal('put')
+        return self.decode(data)
+
+    async def put(self, value):
+        record = self._record(value)
+        while not self._put(record):
+            await self._wait(self._putters)
+
+    async def get(self):
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                await self._wait(self._getters)
+
+    def __len__(self):
+        _, _, head, tail, count = HEADER.unpack_from(self._mmap)
+        return count
+
+    async def status(self):
+        _, _, head, tail, count = HEADER.unpack_from(self._mmap)
+        return {
+            'size': count,
+            'bytes': tail - head,
+            'capacity': self._capacity,
+        }
@@ -1,86 +1,212 @@
 import asyncio
+import collections
 import heapq
+import itertools
 import time
 
 from .base import AbstractQueue, ScoreQueueMixin
 
 
 class TimestampQueue(ScoreQueueMixin, AbstractQueue):
+    """ Values are got not before timestamp of their score.
+    Earliest value is the head of heap, one timer is scheduled
+    at its timestamp while there are waiters
+    and it moves only when head changes.
+    """
     default_score = 'time.time'
 
     def init(self):
-        self._future = None
+        self._handle = None
+        self._handle_at = None
         self._queue = []
-        self._waiters = []
+        self._waiters = collections.deque()
         self.context.on_stop.append(self.stop)
         return super().init()
 
     async def stop(self):
-        if self._future and not self._future.done():
-            self._future.cancel()
+        self._cancel_timer()
         for s, i in self._waiters:
             i.cancel()
-        self._waiters = []
+        self._waiters.clear()
 
     def __len__(self):
         return len(self._queue)
 
+    def _score(self, score):
+        if score is None:
+            if callable(self._default_score):
+                score = self._default_score()
+        return score
+
+    def _pop(self):
+        """ Returns (score, value) of head """
+        return heapq.heappop(self._queue)
+
+    def _head(self):
+        """ Returns score of head or None if queue is empty """
+        if self._queue:
+            return self._queue[0][0]
+
     def get(self, score=False):
         waiter = self.loop.create_future()
-        if self._queue:
-            timestamp, value = heapq.nsmallest(1, self._queue)[0]
-            if time.time() >= timestamp:
-                ts, value = heapq.heappop(self._queue)
+        if not self._waiters:
+            ts = self._head()
+            if ts is not None and time.time() >= ts:
+                ts, value = self._pop()
                 if score:
                     waiter.set_result((value, ts))
                 else:
                     waiter.set_result(value)
                 return waiter
-            if not self._future or self._future.done():
-                self._future = self.loop.create_task(self._timer())
         self._waiters.append((score, waiter))
+        self._schedule()
         return waiter
 
+    def _push(self, value, score):
+        heapq.heappush(self._queue, (self._score(score), value))
+
     async def put(self, value, score=None):
-        if score is None:
-            if callable(self._default_score):
-                score = self._default_score()
-        heapq.heappush(self._queue, (score, value))
-        if self._future and not self._future.done():
-            self._future.cancel()
-        self._future = self.loop.create_task(self._timer())
-
-    async def _timer(self):
-        if not self._queue or not self._waiters:
-            return
-
-        ts = heapq.nsmallest(1, self._queue)[0][0]
-        t = ts - time.time()
-        if t < 0:
-            score, f = self._waiters.pop(0)
-            ts, val = heapq.heappop(self._queue)
+        self._push(value, score)
+        if self._waiters:
+            self._schedule()
+
+    async def put_many(self, items):
+        """ Puts values with default score, timer is moved once """
+        for value in items:
+            self._push(value, None)
+        if self._waiters:
+            self._schedule()
+
+    async def get_many(self, max_items: int, timeout=None, score=False):
+        """ Waits first value, then takes due values
+        and waits up to timeout for the rest of max_items """
+        items = [await self.get(True)]
+        deadline = self.loop.time() + (timeout or 0)
+        try:
+            while len(items) < max_items:
+                ts = self._head()
+                if not self._waiters and ts is not None and \
+                        time.time() >= ts:
+                    ts, value = self._pop()
+                    items.append((value, ts))
+                    continue
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(
+                        self.get(True), remaining, loop=self.loop))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # values are returned with their scores
+            for value, ts in items:
+                self._push(value, ts)
+            if self._waiters:
+                self._schedule()
+            raise
+        if score:
+            return items
+        return [value for value, ts in items]
+
+    def clear(self) -> list:
+        """ Removes all values, returns them in order of score """
+        values = []
+        while self._head() is not None:
+            values.append(self._pop()[1])
+        self._schedule()
+        return values
+
+    def _cancel_timer(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self._handle_at = None
+
+    def _schedule(self):
+        ts = self._head() if self._waiters else None
+        if ts is None:
+            self._cancel_timer()
+        elif self._handle is None or ts != self._handle_at:
+            self._cancel_timer()
+            when = self.loop.time() + ts - time.time()
+            self._handle = self.loop.call_at(when, self._wakeup)
+            self._handle_at = ts
+
+    def _wakeup(self):
+        self._handle = None
+        self._handle_at = None
+        now = time.time()
+        waiters = self._waiters
+        while waiters:
+            ts = self._head()
+            if ts is None or ts > now:
+                break
+            score, waiter = waiters.popleft()
+            if waiter.done():
+                continue
+            ts, value = self._pop()
             if score:
-                f.set_result((val, ts))
+                waiter.set_result((value, ts))
             else:
-                f.set_result(val)
-        else:
-            await asyncio.sleep(t, loop=self.loop)
-            self._future = self.loop.create_task(self._timer())
+                waiter.set_result(value)
+        self._schedule()
 
 
 class UniqueQueue(TimestampQueue):
-    async def put(self, value, score=None):
-        if score is None:
-            if callable(self._default_score):
-                score = self._default_score()
-        item = score, value
-        for i, (t, v) in enumerate(self._queue):
-            if v == value:
-                self._queue[i] = item
-                heapq.heapify(self._queue)
-                break
-        else:
-            heapq.heappush(self._queue, item)
-        if self._future and not self._future.done():
-            self._future.cancel()
-        self._future = self.loop.create_task(self._timer())
+    """ Keeps one item per value, put of queued value moves it to new score.
+    Index maps value to its heap entry, moved and removed entries stay
+    in heap marked as removed until they reach head
+    or heap is rebuilt when they are majority.
+    Values must be hashable.
+    """
+    _removed = object()
+
+    def init(self):
+        self._index = {}
+        self._counter = itertools.count()
+        return super().init()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, value):
+        return value in self._index
+
+    def _invalidate(self, value):
+        entry = self._index.pop(value, None)
+        if entry is None:
+            return False
+        entry[-1] = self._removed
+        if len(self._queue) > 2 * len(self._index) + 64:
+            self._queue = [
+                e for e in self._queue if e[-1] is not self._removed]
+            heapq.heapify(self._queue)
+        return True
+
+    def _head(self):
+        queue = self._queue
+        while queue and queue[0][-1] is self._removed:
+            heapq.heappop(queue)
+        if queue:
+            return queue[0][0]
+
+    def _pop(self):
+        self._head()
+        score, _, value = heapq.heappop(self._queue)
+        del self._index[value]
+        return score, value
+
+    def _push(self, value, score):
+        self._invalidate(value)
+        entry = [self._score(score), next(self._counter), value]
+        self._index[value] = entry
+        heapq.heappush(self._queue, entry)
+
+    def remove(self, value) -> bool:
+        """ Returns True if value was queued """
+        if not self._invalidate(value):
+            return False
+        if self._waiters:
+            self._schedule()
+        return True
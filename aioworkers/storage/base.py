@@ -1,3 +1,5 @@
+import asyncio
+import weakref
 from abc import abstractmethod
 
 from aioworkers.core.base import AbstractNamedEntity
@@ -14,6 +16,11 @@ class AbstractStorageReadOnly(AbstractBaseStorage):
     async def get(self, key):
         raise NotImplementedError()
 
+    async def get_many(self, keys):
+        """ Returns list of values in order of keys """
+        return await asyncio.gather(
+            *map(self.get, keys), loop=self.loop)
+
 
 class AbstractFindStorage(AbstractBaseStorage):
     @abstractmethod
@@ -26,6 +33,11 @@ class AbstractStorageWriteOnly(AbstractBaseStorage):
     async def set(self, key, value):
         raise NotImplementedError()
 
+    async def set_many(self, items):
+        """ items: iterable of pairs (key, value) """
+        await asyncio.gather(
+            *(self.set(k, v) for k, v in items), loop=self.loop)
+
 
 class AbstractStorage(AbstractStorageReadOnly, AbstractStorageWriteOnly):
     async def copy(self, key_source, storage_dest, key_dest):
@@ -40,11 +52,102 @@ class AbstractStorage(AbstractStorageReadOnly, AbstractStorageWriteOnly):
         return result
 
 
+class AbstractStreamReadOnly(AbstractStorageReadOnly):
+    @abstractmethod
+    def open_read(self, key, chunk_size=None):
+        """ Returns async context manager of async iterator of bytes.
+        Iterator is None if key does not exist
+        """
+        raise NotImplementedError()
+
+    async def copy(self, key_source, storage_dest, key_dest):
+        """ Return True if data are copied """
+        if isinstance(storage_dest, AbstractStreamWriteOnly):
+            return await pipe(self, key_source, storage_dest, key_dest)
+        return await AbstractStorage.copy(
+            self, key_source, storage_dest, key_dest)
+
+
+class AbstractStreamWriteOnly(AbstractStorageWriteOnly):
+    @abstractmethod
+    def open_write(self, key):
+        """ Returns async context manager of writer
+        with coroutine write(bytes).
+        Value is stored when context exits without error
+        """
+        raise NotImplementedError()
+
+
+class AbstractStreamStorage(
+        AbstractStreamReadOnly, AbstractStreamWriteOnly, AbstractStorage):
+    pass
+
+
+async def pipe(source, key_source, dest, key_dest, maxsize=4):
+    """ Copies value by chunks, keeps at most maxsize chunks in memory.
+    Return True if data are copied
+    """
+    async with source.open_read(key_source) as reader:
+        if reader is None:
+            await dest.set(key_dest, None)
+            return False
+        queue = asyncio.Queue(maxsize, loop=source.loop)
+
+        async def produce():
+            try:
+                async for chunk in reader:
+                    await queue.put(chunk)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        producer = asyncio.ensure_future(produce(), loop=source.loop)
+        try:
+            async with dest.open_write(key_dest) as writer:
+                while True:
+                    chunk = await queue.get()
+                    if chunk is None:
+                        break
+                    elif isinstance(chunk, Exception):
+                        raise chunk
+                    await writer.write(chunk)
+        finally:
+            producer.cancel()
+    return True
+
+
+class KeyBatches:
+    """ Async iterator of lists of keys from list of storage """
+
+    def __init__(self, storage, batch: int):
+        self._storage = storage
+        self._batch = batch
+        self._keys = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._keys is None:
+            self._keys = list(await self._storage.list())
+        if not self._keys:
+            raise StopAsyncIteration()
+        keys = self._keys[:self._batch]
+        del self._keys[:self._batch]
+        return keys
+
+
 class AbstractListedStorage(AbstractStorage):
     @abstractmethod
     async def list(self):
         raise NotImplementedError()
 
+    def iter_keys(self, batch: int = 100):
+        """ Returns async iterator of lists of all keys up to batch,
+        storage which list is not complete overrides it """
+        return KeyBatches(self, batch)
+
     @abstractmethod
     async def length(self):
         raise NotImplementedError()
@@ -57,27 +160,59 @@ class AbstractExpiryStorage(AbstractStorage):
 
 
 class FieldStorageMixin(AbstractStorage):
+    """ Access to fields of mapping values.
+    Backend which reads or writes fields without whole value
+    overrides get_fields and set_fields.
+    Default set_fields is read-modify-write under lock of key,
+    which also serializes set of whole value.
+    """
     model = dict
 
-    async def get(self, key, *, field=None, fields=None):
+    def __init__(self, *args, **kwargs):
+        self._field_locks = weakref.WeakValueDictionary()
+        super().__init__(*args, **kwargs)
+
+    def field_lock(self, key) -> asyncio.Lock:
+        k = self.raw_key(key)
+        lock = self._field_locks.get(k)
+        if lock is None:
+            lock = self._field_locks[k] = asyncio.Lock(loop=self.loop)
+        return lock
+
+    async def get_fields(self, key, fields):
+        """ Returns model with fields of value or None """
         value = await super().get(key)
+        if value is None:
+            return None
+        m = self.model()
+        for f in fields:
+            m[f] = value[f]
+        return m
+
+    async def set_fields(self, key, fields):
+        """ Updates value by mapping of fields """
+        async with self.field_lock(key):
+            m = await super().get(key)
+            if m is None:
+                m = self.model()
+            for f, v in fields.items():
+                m[f] = v
+            await super().set(key, m)
+
+    async def get(self, key, *, field=None, fields=None):
         if field:
-            return value[field]
+            m = await self.get_fields(key, [field])
+            return None if m is None else m[field]
         elif fields:
-            m = self.model()
-            for f in fields:
-                m[f] = value[f]
-            return m
+            return await self.get_fields(key, fields)
         else:
-            return value
+            return await super().get(key)
 
     async def set(self, key, value, *, field=None, fields=None):
-        if field or fields:
-            m = await super().get(key)
-            if field:
-                m[field] = value
-            else:
-                for f in fields:
-                    m[f] = value[f]
-            value = m
-        await super().set(key, value)
+        if field:
+            await self.set_fields(key, {field: value})
+        elif fields:
+            await self.set_fields(key, {f: value[f] for f in fields})
+        else:
+            async with self.field_lock(key):
+                await super().set(key, value)
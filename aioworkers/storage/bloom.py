@@ -0,0 +1,220 @@
+import collections
+import hashlib
+import math
+import os
+import pickle
+from functools import partial
+from typing import List
+
+from . import base
+from .filesystem import BaseFileSystemStorage
+from .meta import BackgroundMixin
+
+__all__ = (
+    'BloomFilter',
+    'BloomFilterStorage',
+    'ScalableBloomFilter',
+)
+
+
+class BloomFilter:
+    """
+    >>> f = BloomFilter(100, 0.01)
+    >>> f.add(b'a')
+    True
+    >>> b'a' in f, b'b' in f
+    (True, False)
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key: bytes):
+        digest = hashlib.md5(key).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(
+            bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(key))
+
+    def add(self, key: bytes) -> bool:
+        """ Returns True if key was not in filter """
+        added = False
+        bits = self.bits
+        for i in self._indexes(key):
+            mask = 1 << (i & 7)
+            if not bits[i >> 3] & mask:
+                bits[i >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    @property
+    def memory(self) -> int:
+        return len(self.bits)
+
+
+class ScalableBloomFilter:
+    """ Adds filters of growing capacity and tightening error rate,
+    so total error rate stays below error_rate
+
+    >>> f = ScalableBloomFilter(10, 0.01)
+    >>> for i in range(100):
+    ...     f.add(str(i).encode())
+    >>> all(str(i).encode() in f for i in range(100))
+    True
+    >>> len(f.filters) > 1
+    True
+    """
+    growth = 2
+    ratio = 0.5
+
+    def __init__(self, capacity: int = 1 << 16, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters = []  # type: List[BloomFilter]
+
+    def __contains__(self, key: bytes) -> bool:
+        return any(key in f for f in reversed(self.filters))
+
+    def add(self, key: bytes):
+        if key in self:
+            return
+        if not self.filters or \
+                self.filters[-1].count >= self.filters[-1].capacity:
+            n = len(self.filters)
+            self.filters.append(BloomFilter(
+                self.capacity * self.growth ** n,
+                self.error_rate * (1 - self.ratio) * self.ratio ** n,
+            ))
+        self.filters[-1].add(key)
+
+    @property
+    def count(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    @property
+    def memory(self) -> int:
+        return sum(f.memory for f in self.filters)
+
+
+class BloomFilterStorage(BackgroundMixin, base.AbstractStorage):
+    """ Answers get of never written keys without reading storage.
+    Filter is complete when it is loaded from file or rebuilt by walk
+    of filesystem storage or by keys of listed storage,
+    until then get reads storage.
+    Writes to storage bypassing this entity are not seen by filter.
+    config:
+        storage: str path to storage
+        capacity: int expected count of keys, default 65536
+        error_rate: float false positive rate, default 0.01
+        path: str file to keep filter between runs.
+            It is removed while running, so filter is rebuilt after crash
+        trust: bool filter is complete without file or list,
+            e.g. for new storage
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._filter = None
+        self._complete = False
+        self.counter = collections.Counter()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._capacity = self.config.get_int('capacity', 1 << 16)
+        self._error_rate = self.config.get_float('error_rate', 0.01)
+        self._path = self.config.get('path')
+        self._complete = self.config.get_bool('trust', False)
+        self._filter = ScalableBloomFilter(self._capacity, self._error_rate)
+
+    async def init(self):
+        await super().init()
+        if self._path and await self._run(os.path.exists, self._path):
+            self._filter = await self._run(self._load, self._path)
+            self._complete = True
+        elif not self._complete:
+            self._background(self.rebuild())
+
+    async def stop(self):
+        await super().stop()
+        if self._path and self._complete:
+            await self._run(self._dump, self._path, self._filter)
+
+    def _run(self, f, *args, **kwargs):
+        return self.loop.run_in_executor(None, partial(f, *args, **kwargs))
+
+    @staticmethod
+    def _load(path):
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        os.unlink(path)
+        return result
+
+    @staticmethod
+    def _dump(path, bloom):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(bloom, f)
+        os.replace(tmp, path)
+
+    @property
+    def storage(self):
+        return self.context[self.config.storage]
+
+    def raw_key(self, key):
+        return key
+
+    def _bloom_key(self, key) -> bytes:
+        return str(self.storage.raw_key(key)).encode()
+
+    async def rebuild(self):
+        """ Adds all keys of storage and marks filter complete,
+        filter of storage which keys are not known stays incomplete """
+        storage = self.storage
+        if isinstance(storage, BaseFileSystemStorage):
+            async for paths in storage.iter_paths(1000):
+                for path in paths:
+                    self._filter.add(path.encode())
+        elif isinstance(storage, base.AbstractListedStorage):
+            async for keys in storage.iter_keys(1000):
+                for key in keys:
+                    self._filter.add(self._bloom_key(key))
+        else:
+            return
+        self._complete = True
+
+    async def get(self, key):
+        key = self.raw_key(key)
+        if self._complete and self._bloom_key(key) not in self._filter:
+            self.counter['negative'] += 1
+            return None
+        return await self.storage.get(key)
+
+    async def set(self, key, value):
+        key = self.raw_key(key)
+        if value is not None:
+            self._filter.add(self._bloom_key(key))
+        await self.storage.set(key, value)
+
+    async def status(self):
+        f = self._filter
+        return {
+            'complete': self._complete,
+            'items': f.count,
+            'filters': len(f.filters),
+            'memory': f.memory,
+            'error_rate': self._error_rate,
+            **self.counter,
+        }
@@ -1,31 +1,52 @@
+import asyncio
 import hashlib
+import io
+import itertools
+import json
+import logging
 import os
 import pathlib
 import shutil
 import tempfile
+import threading
+import time
+import zlib
 from functools import partial
 from pathlib import Path, PurePath
+from typing import List, Optional
 
 from .. import humanize
 from ..core.base import AbstractNestedEntity, ExecutorEntity
+from ..core.executor import (
+    PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, PriorityThreadPoolExecutor
+)
 from ..core.formatter import FormattedEntity
+from ..core.timer import TimerWheel
 from . import StorageError, base
 
+logger = logging.getLogger(__name__)
+
+EXPIRY_JOURNAL = '.expiry'
+
 __all__ = (
     'AsyncPath',
+    'ContentHashFileSystemStorage',
+    'FieldFileSystemStorage',
     'FileSystemStorage',
     'HashFileSystemStorage',
     'NestedFileSystemStorage',
 )
 
 
-def async_method(self, method: str, sync_obj=None):
+def async_method(self, method: str, sync_obj=None, *,
+                 key=None, priority=PRIORITY_NORMAL):
     if sync_obj is None:
         sync_obj = self
     m = getattr(sync_obj, method)
 
     def wrap(*args, **kwargs):
-        return self.storage.run_in_executor(m, *args, **kwargs)
+        return self.storage.run_in_path_executor(
+            key, priority, m, *args, **kwargs)
     return wrap
 
 
@@ -49,13 +70,220 @@ def flat(parts):
             'But {}'.format(parts))
 
 
+def fsync_path(path):
+    if os.name == 'nt' and os.path.isdir(str(path)):
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommit:
+    """ Collects paths written by concurrent set() calls
+    and syncs them in one executor call per batch.
+    Every directory is synced once per batch.
+    """
+
+    def __init__(self, storage, window=0):
+        self._storage = storage
+        self._window = window
+        self._paths = set()
+        self._pending = None
+        self._running = None
+
+    def add(self, paths):
+        self._paths.update(paths)
+        if self._pending is None:
+            self._pending = self._storage.loop.create_task(
+                self._flush(self._running))
+        return asyncio.shield(self._pending, loop=self._storage.loop)
+
+    def _sync(self, paths):
+        for path in paths:
+            try:
+                fsync_path(path)
+            except FileNotFoundError:
+                pass
+
+    async def _flush(self, previous):
+        loop = self._storage.loop
+        if previous is not None:
+            await asyncio.wait([previous], loop=loop)
+        if self._window:
+            await asyncio.sleep(self._window, loop=loop)
+        paths, self._paths = self._paths, set()
+        self._running, self._pending = self._pending, None
+        await self._storage.run_in_executor(self._sync, paths)
+
+
+class Expiry:
+    """ Deadlines of keys of storage kept in timer wheel.
+    Changes are appended to journal if it is given, which is rewritten
+    when it has much more lines than keys.
+    Reaper deletes expired files in executor by batches,
+    writes of keys of batch wait for it.
+    """
+
+    def __init__(self, storage, journal=None, resolution=1, batch=100):
+        self.storage = storage
+        self.journal = journal and os.path.abspath(journal)
+        self.wheel = TimerWheel(resolution, now=time.time())
+        self._batch = batch
+        self._pending = []
+        self._lines = 0
+        self._lock = None
+        self._reaping = {}
+        self._reaper = None
+        self._in_executor = set()
+        self._reaped = None
+
+    def _load(self):
+        deadlines = {}
+        lines = 0
+        if not self.journal:
+            return deadlines, lines
+        try:
+            with open(self.journal) as f:
+                for line in f:
+                    try:
+                        key, deadline = json.loads(line)
+                    except ValueError:
+                        continue  # torn write at crash
+                    lines += 1
+                    if deadline is None:
+                        deadlines.pop(key, None)
+                    else:
+                        deadlines[key] = deadline
+        except FileNotFoundError:
+            pass
+        return deadlines, lines
+
+    def _append(self, lines):
+        os.makedirs(os.path.dirname(self.journal), exist_ok=True)
+        with open(self.journal, 'a') as f:
+            f.writelines(lines)
+
+    def _rewrite(self, deadlines):
+        tmp = self.journal + '.tmp'
+        with open(tmp, 'w') as f:
+            for item in deadlines:
+                f.write(json.dumps(item) + '\n')
+        os.replace(tmp, self.journal)
+
+    async def init(self):
+        self._lock = asyncio.Lock(loop=self.storage.loop)
+        deadlines, self._lines = await self.storage.run_in_executor(
+            self._load)
+        for key, deadline in deadlines.items():
+            self.wheel.add(key, deadline)
+        if self.wheel:
+            self._start()
+
+    def _start(self):
+        if self._reaper is None:
+            self._reaper = self.storage.loop.create_task(self._reap())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.wait([self._reaper], loop=self.storage.loop)
+            self._reaper = None
+        await self.flush()
+
+    def expired(self, key: str, now=None) -> bool:
+        if key in self._reaping:
+            return True
+        deadline = self.wheel.get(key)
+        return deadline is not None and deadline <= (now or time.time())
+
+    def __contains__(self, key: str):
+        return key in self.wheel or key in self._reaping
+
+    async def set(self, key: str, deadline):
+        while key in self._in_executor:
+            await asyncio.wait([self._reaped], loop=self.storage.loop)
+        self._reaping.pop(key, None)
+        if deadline is None:
+            self.wheel.remove(key)
+        else:
+            self.wheel.add(key, deadline)
+            self._start()
+        self._pending.append(json.dumps([key, deadline]) + '\n')
+        await self.flush()
+
+    async def flush(self):
+        if not self.journal:
+            self._pending.clear()
+            return
+        elif self._lock is None:
+            return
+        async with self._lock:
+            lines, self._pending = self._pending, []
+            if not lines:
+                return
+            self._lines += len(lines)
+            size = len(self.wheel) + len(self._reaping)
+            if self._lines > 2 * size + 100:
+                deadlines = list(self.wheel.items())
+                deadlines.extend(self._reaping.items())
+                self._lines = len(deadlines)
+                await self.storage.run_in_executor(self._rewrite, deadlines)
+            else:
+                await self.storage.run_in_executor(self._append, lines)
+
+    async def _reap(self):
+        loop = self.storage.loop
+        while True:
+            await asyncio.sleep(self.wheel.resolution, loop=loop)
+            now = time.time()
+            for key in self.wheel.advance(now):
+                self._reaping[key] = now
+            while self._reaping:
+                batch = list(itertools.islice(self._reaping, self._batch))
+                self._in_executor.update(batch)
+                self._reaped = loop.create_future()
+                try:
+                    await self.storage.reap(batch)
+                except Exception:
+                    logger.exception('Reaping expired keys failed')
+                finally:
+                    self._in_executor.clear()
+                    self._reaped.set_result(None)
+                for key in batch:
+                    if key in self._reaping:
+                        del self._reaping[key]
+                        self._pending.append(
+                            json.dumps([key, None]) + '\n')
+                await self.flush()
+
+
 class AsyncFile:
-    def __init__(self, fd, storage=None):
+    """ Buffered asynchronous file.
+    Reads and writes go to the executor in blocks of buffer_size,
+    lines are split in the loop.
+    """
+    buffer_size = 1 << 18
+
+    def __init__(self, fd, storage=None, path=None, buffer_size=None):
         self.fd = fd
         self.storage = storage
+        self.path = path
+        if buffer_size:
+            self.buffer_size = buffer_size
         self._closed = False
-        for i in ('write', 'read'):
-            setattr(self, i, async_method(self, i, fd))
+        self._text = isinstance(fd, io.TextIOBase)
+        self._empty = '' if self._text else b''
+        self._nl = '\n' if self._text else b'\n'
+        self._rbuf = self._empty
+        self._rpos = 0
+        self._wbuf = []
+        self._wsize = 0
+
+    def _run(self, f, *args):
+        return self.storage.run_in_path_executor(
+            self.path, PRIORITY_NORMAL, f, *args)
 
     async def __aenter__(self):
         assert not self._closed
@@ -64,26 +292,141 @@ class AsyncFile:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
+    def _write_close(self, data, close=False):
+        try:
+            if data:
+                self.fd.write(data)
+            if not close:
+                self.fd.flush()
+        finally:
+            if close:
+                self.fd.close()
+
+    def _pop_write_buffer(self):
+        data = self._empty.join(self._wbuf)
+        self._wbuf = []
+        self._wsize = 0
+        return data
+
     async def close(self):
         assert not self._closed
-        await self.storage.run_in_executor(self.fd.close)
+        self._closed = True
+        await self._run(self._write_close, self._pop_write_buffer(), True)
         await self.storage.next_space_waiter()
 
+    async def flush(self):
+        await self._run(self._write_close, self._pop_write_buffer())
+
+    async def write(self, data):
+        if self._rpos < len(self._rbuf):
+            await self.seek(0, io.SEEK_CUR)
+        self._wbuf.append(data)
+        self._wsize += len(data)
+        if self._wsize >= self.buffer_size:
+            await self.flush()
+        return len(data)
+
+    def _take(self, size=-1):
+        buf, pos = self._rbuf, self._rpos
+        if size is None or size < 0:
+            end = len(buf)
+        else:
+            end = min(pos + size, len(buf))
+        self._rpos = end
+        if end == len(buf):
+            self._rbuf, self._rpos = self._empty, 0
+        return buf[pos:end]
+
+    async def _fill(self):
+        if self._wbuf:
+            await self.flush()
+        chunk = await self._run(self.fd.read, self.buffer_size)
+        if chunk:
+            self._rbuf = self._rbuf[self._rpos:] + chunk
+            self._rpos = 0
+        return len(chunk)
+
+    async def read(self, size=-1):
+        if self._wbuf:
+            await self.flush()
+        result = self._take(size)
+        if size is None or size < 0:
+            return result + await self._run(self.fd.read)
+        elif len(result) < size:
+            result += await self._run(self.fd.read, size - len(result))
+        return result
+
+    async def readinto(self, buffer):
+        assert not self._text, 'readinto supports only binary mode'
+        view = memoryview(buffer).cast('B')
+        head = self._take(len(view))
+        n = len(head)
+        view[:n] = head
+        if n < len(view):
+            if self._wbuf:
+                await self.flush()
+            n += await self._run(self.fd.readinto, view[n:]) or 0
+        return n
+
+    async def readline(self):
+        start = self._rpos
+        while True:
+            i = self._rbuf.find(self._nl, start)
+            if i >= 0:
+                return self._take(i + 1 - self._rpos)
+            start = len(self._rbuf) - self._rpos
+            if not await self._fill():
+                return self._take()
+            start += self._rpos
+
+    async def seek(self, offset, whence=io.SEEK_SET):
+        if self._wbuf:
+            await self.flush()
+        unread = len(self._rbuf) - self._rpos
+        if unread and whence == io.SEEK_CUR:
+            if self._text:
+                raise io.UnsupportedOperation(
+                    'can not seek from current position '
+                    'of text file with buffered data')
+            offset -= unread
+        self._rbuf, self._rpos = self._empty, 0
+        return await self._run(self.fd.seek, offset, whence)
+
+    def iter_chunks(self, size=None):
+        return AsyncFileChunks(self, size or self.buffer_size)
+
     def __aiter__(self):
         return self
 
     async def __anext__(self):
-        result = await self.storage.run_in_executor(next, self.fd, None)
-        if result is None:
+        result = await self.readline()
+        if not result:
+            raise StopAsyncIteration()
+        else:
+            return result
+
+
+class AsyncFileChunks:
+    def __init__(self, af, size):
+        self._af = af
+        self._size = size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        result = await self._af.read(self._size)
+        if not result:
             raise StopAsyncIteration()
         else:
             return result
 
 
 class AsyncFileContextManager:
-    def __init__(self, path, *args, **kwargs):
+    def __init__(self, path, *args, buffer_size=None, **kwargs):
         self.path = path
         self.af = None
+        self.buffer_size = buffer_size
         if 'mode' in kwargs:
             self.mode = kwargs['mode']
         elif len(args) > 1:
@@ -99,8 +442,9 @@ class AsyncFileContextManager:
         await storage.wait_free_space()
         if 'w' in self.mode or '+' in self.mode:
             await path.parent.mkdir(parents=True, exist_ok=True)
-        fd = await storage.run_in_executor(self._constructor)
-        self.af = AsyncFile(fd, storage)
+        fd = await storage.run_in_path_executor(
+            path, PRIORITY_HIGH, self._constructor)
+        self.af = AsyncFile(fd, storage, path, self.buffer_size)
         return self.af
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -111,23 +455,142 @@ class AsyncFileContextManager:
         return self.__aenter__().__await__()
 
 
+class AsyncStreamReader:
+    def __init__(self, storage, key, chunk_size=None):
+        self._storage = storage
+        self._key = key
+        self._chunk_size = chunk_size
+        self._af = None
+
+    async def __aenter__(self):
+        path = await self._storage.stream_path(self._key)
+        if path is None:
+            return None
+        try:
+            self._af = await path.open('rb', buffer_size=self._chunk_size)
+        except FileNotFoundError:
+            return None
+        return self._af.iter_chunks(self._chunk_size)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._af is not None:
+            await self._af.close()
+            self._af = None
+
+
+class AsyncStreamFile:
+    """ Opens file of value by path from storage.stream_path """
+
+    def __init__(self, storage, key, *args, **kwargs):
+        self._storage = storage
+        self._key = key
+        self._args = args
+        self._kwargs = kwargs
+        self._cm = None
+
+    async def __aenter__(self):
+        path = await self._storage.stream_path(self._key)
+        if path is None:
+            raise FileNotFoundError(self._key)
+        self._cm = path.open(*self._args, **self._kwargs)
+        return await self._cm.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        cm, self._cm = self._cm, None
+        await cm.__aexit__(exc_type, exc_val, exc_tb)
+
+    def __await__(self):
+        return self.__aenter__().__await__()
+
+
+class AsyncStreamWriter:
+    """ Writes to temporary file, which replaces value on exit """
+
+    def __init__(self, storage, key):
+        self._storage = storage
+        self._key = key
+        self._af = None
+
+    async def __aenter__(self):
+        storage = self._storage
+        await storage.wait_free_space()
+        path = storage.raw_key(self._key)
+        fd = await storage.run_in_path_executor(
+            path, PRIORITY_HIGH, tempfile.NamedTemporaryFile,
+            dir=storage._tmp, delete=False)
+        self._af = AsyncFile(fd, storage, path)
+        return self._af
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        storage = self._storage
+        af, self._af = self._af, None
+        source = af.fd.name
+        try:
+            await af.close()
+        except BaseException:
+            await storage.run_in_executor(os.unlink, source)
+            raise
+        if exc_type is not None:
+            await storage.run_in_executor(os.unlink, source)
+            return
+        try:
+            await storage.reset_expiry(af.path)
+            paths = await storage.run_in_path_executor(
+                af.path, PRIORITY_NORMAL,
+                storage._commit_stream, source, af.path.path)
+            await storage.commit(paths)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+
 class AsyncGlob:
     def __init__(self, path, pattern):
         self._factory = type(path)
         self._iter = path.path.glob(pattern)
+        self._path = path
         self.storage = path.storage
 
     def __aiter__(self):
         return self
 
     async def __anext__(self):
-        result = await self.storage.run_in_executor(next, self._iter, None)
+        result = await self.storage.run_in_path_executor(
+            self._path, PRIORITY_HIGH, next, self._iter, None)
         if result is None:
             raise StopAsyncIteration()
         else:
             return self._factory(result, storage=self.storage)
 
 
+class AsyncWalk:
+    """ Async iterator of lists of paths of values of storage up to batch,
+    files are walked recursively in executor.
+    Paths are relative to root if it is given
+    """
+
+    def __init__(self, storage, batch, root=None):
+        self.storage = storage
+        self._batch = batch
+        self._root = root
+        self._iter = storage.walk()
+
+    def __aiter__(self):
+        return self
+
+    def _next(self):
+        paths = itertools.islice(self._iter, self._batch)
+        if self._root is None:
+            return [os.path.normpath(str(p)) for p in paths]
+        return [os.path.relpath(str(p), self._root) for p in paths]
+
+    async def __anext__(self):
+        paths = await self.storage.run_in_path_executor(
+            self.storage._path, PRIORITY_LOW, self._next)
+        if not paths:
+            raise StopAsyncIteration()
+        return paths
+
+
 class AsyncPath(PurePath):
     def __new__(cls, *args, storage=None):
         if cls is AsyncPath:
@@ -153,10 +616,14 @@ class AsyncPath(PurePath):
         for i in (
             'write_bytes', 'read_bytes',
             'write_text', 'read_text',
+        ):
+            setattr(self, i, async_method(self, i, self.path, key=self))
+        for i in (
             'exists', 'mkdir', 'stat',
             'unlink',
         ):
-            setattr(self, i, async_method(self, i, self.path))
+            setattr(self, i, async_method(
+                self, i, self.path, key=self, priority=PRIORITY_HIGH))
 
     def _make_child(self, args):
         k = super()._make_child(args)
@@ -221,20 +688,65 @@ class MockFileSystemStorage(ExecutorEntity):
     async def next_space_waiter(self):
         pass
 
+    def run_in_path_executor(self, path, priority, f, *args, **kwargs):
+        return self.run_in_executor(f, *args, **kwargs)
+
 
 class BaseFileSystemStorage(
         AbstractNestedEntity,
         ExecutorEntity,
         FormattedEntity,
-        base.AbstractStorage):
+        base.AbstractStreamStorage,
+        base.AbstractExpiryStorage):
+    """
+    config:
+        path: str
+        tmp: str path for temporary files, default path
+        limit_free_space: int in MB or str size
+        durability: [none|fsync|group], default none
+            fsync - each write is synced before set returns
+            group - file is synced before it replaces key,
+                directories of concurrent writes are synced in batches
+        commit_window: duration of collecting batch for group durability
+        executor: int count of threads or str path to executor
+        shards: int count of executors with own threads,
+            calls are spread between them by hash of path
+        expiry_journal: str file of deadlines,
+            default path/.expiry.name where name is entity path
+        expiry_resolution: duration of timer wheel tick, default 1s
+        expiry_batch: int count of files deleted by one executor call,
+            default 100
+    """
 
     PARAM_LIMIT_FREE_SPACE = 'limit_free_space'
+    DURABILITY_NONE = 'none'
+    DURABILITY_FSYNC = 'fsync'
+    DURABILITY_GROUP = 'group'
 
     def set_config(self, config):
         super().set_config(config)
+        self._durability = self.config.get(
+            'durability', self.DURABILITY_NONE)
+        if self._durability == self.DURABILITY_GROUP:
+            window = self.config.get_duration('commit_window', default=0)
+            self._group_commit = GroupCommit(self, window)
+        elif self._durability in (
+                self.DURABILITY_NONE, self.DURABILITY_FSYNC):
+            self._group_commit = None
+        else:
+            raise ValueError(
+                'Unknown durability {!r}'.format(self._durability))
         self._space_waiters = []
         self._path = AsyncPath(self.config.path, storage=self)
         self._tmp = self.config.get('tmp') or self.config.path
+        self._expiry = Expiry(
+            self,
+            self.config.get('expiry_journal') or os.path.join(
+                self.config.path,
+                '{}.{}'.format(EXPIRY_JOURNAL, self.config.get('name'))),
+            self.config.get_duration('expiry_resolution', default=1),
+            self.config.get_int('expiry_batch', default=100),
+        )
 
         self._limit = self._config.get(self.PARAM_LIMIT_FREE_SPACE)
         if isinstance(self._limit, int):
@@ -250,13 +762,59 @@ class BaseFileSystemStorage(
             '_formatter',
             '_space_waiters',
             '_executor',
+            '_executors',
             '_tmp',
             '_limit',
+            '_durability',
+            '_group_commit',
+            '_expiry',
         ):
             setattr(inst, i, getattr(self, i))
         inst._path = path
         return inst
 
+    async def init(self):
+        await super().init()
+        if self._expiry.storage is self:
+            await self._expiry.init()
+            self.context.on_stop.append(self._expiry.stop)
+
+    def executor_factory(self, *args, **kwargs):
+        return PriorityThreadPoolExecutor(*args, **kwargs)
+
+    def _create_executor(self):
+        super()._create_executor()
+        self._executors = [self._executor]
+        if self._config is None or self._context is None:
+            return
+        ex = self._config.get(self.PARAM_EXECUTOR)
+        if isinstance(ex, int):
+            shards = self._config.get_int('shards', default=1)
+            for _ in range(shards - 1):
+                self._executors.append(self.executor_factory(max_workers=ex))
+
+    def executor_for(self, path, priority=PRIORITY_NORMAL):
+        executors = self._executors
+        if len(executors) > 1:
+            ex = executors[zlib.crc32(str(path).encode()) % len(executors)]
+        else:
+            ex = executors[0]
+        if isinstance(ex, PriorityThreadPoolExecutor):
+            ex = ex.with_priority(priority)
+        return ex
+
+    def run_in_path_executor(self, path, priority, f, *args, **kwargs):
+        if kwargs:
+            f = partial(f, **kwargs)
+        return self.loop.run_in_executor(
+            self.executor_for(path, priority), f, *args)
+
+    def executors_status(self):
+        return [
+            ex.status() for ex in self._executors
+            if isinstance(ex, PriorityThreadPoolExecutor)
+        ]
+
     def disk_usage(self):
         def disk_usage(path):
             try:
@@ -265,7 +823,8 @@ class BaseFileSystemStorage(
                 os.makedirs(path, exist_ok=True)
             return shutil.disk_usage(path)
 
-        return self.run_in_executor(disk_usage, self._config.path)
+        return self.run_in_path_executor(
+            self._path, PRIORITY_HIGH, disk_usage, self._config.path)
 
     async def get_free_space(self):
         du = await self.disk_usage()
@@ -294,29 +853,125 @@ class BaseFileSystemStorage(
             return
         self._space_waiters.remove(to_del)
 
-    def _write(self, key: Path, value):
+    def _sync(self, to_sync):
+        if self._durability == self.DURABILITY_FSYNC:
+            for p in to_sync:
+                fsync_path(p)
+            to_sync.clear()
+        return to_sync
+
+    def _move_into(self, source: str, key: Path):
+        """ Moves file to key
+        Returns paths which are not synced yet """
+        fsync = self._durability != self.DURABILITY_NONE
+        to_sync = []  # type: List[Path]
         d = key.parent
-        if d.exists():
-            pass
-        elif value is None:
-            return
-        else:
-            d.mkdir(parents=True)
-        if value is not None:
-            with tempfile.NamedTemporaryFile(
-                    dir=self._tmp,
-                    delete=False) as f:
-                source = f.name
-                f.write(value)
-            shutil.move(source, str(key))
-        elif not key.exists():
-            pass
+        if not d.exists():
+            d.mkdir(parents=True, exist_ok=True)
+            to_sync.append(d.parent)
+        if fsync:
+            fsync_path(source)
+        shutil.move(source, str(key))
+        if not fsync:
+            to_sync.append(key)
+        to_sync.append(d)
+        return self._sync(to_sync)
+
+    def _write(self, key: Path, value):
+        """ Returns paths which are not synced yet """
+        if value is None:
+            return self._delete(key)
+        with tempfile.NamedTemporaryFile(
+                dir=self._tmp,
+                delete=False) as f:
+            source = f.name
+            f.write(value)
+        return self._move_into(source, key)
+
+    def _delete(self, key: Path):
+        if not key.exists():
+            return []
         elif key.is_dir():
             shutil.rmtree(str(key))
         else:
             with tempfile.NamedTemporaryFile(
                     dir=self._tmp) as f:
                 shutil.move(str(key), f.name)
+        return self._sync([key.parent])
+
+    async def commit(self, paths):
+        if paths and self._group_commit is not None:
+            await self._group_commit.add(paths)
+
+    def expiry_key(self, path) -> str:
+        return os.path.relpath(str(path), str(self._expiry.storage._path))
+
+    def is_expired(self, path) -> bool:
+        return self._expiry.expired(self.expiry_key(path))
+
+    async def expiry(self, key, expiry):
+        """ Set time to live in seconds, None removes expiry.
+        Value written by set loses expiry """
+        deadline = None if expiry is None else time.time() + expiry
+        await self._expiry.set(self.expiry_key(self.raw_key(key)), deadline)
+
+    async def reset_expiry(self, path):
+        key = self.expiry_key(path)
+        if key in self._expiry:
+            await self._expiry.set(key, None)
+
+    def _expire(self, path: Path):
+        return self._write(path, None)
+
+    def _reap(self, keys):
+        root = self._expiry.storage._path.path
+        to_sync = []  # type: List[Path]
+        for key in keys:
+            if self._expiry.expired(key):
+                to_sync += self._expire(root.joinpath(key))
+        return to_sync
+
+    async def reap(self, keys):
+        """ Deletes files of expired keys """
+        paths = await self.run_in_path_executor(
+            self._path, PRIORITY_LOW, self._reap, keys)
+        await self.commit(paths)
+
+    def _walk(self, root: Path):
+        """ Yields directories with names of files under root
+        except temporary files and journal """
+        top = str(root)
+        tmp = os.path.join(top, os.path.relpath(
+            os.path.abspath(self._tmp), os.path.abspath(top)))
+        for d, dirs, files in os.walk(top):
+            dirs[:] = [i for i in dirs if os.path.join(d, i) != tmp]
+            yield d, [
+                i for i in files
+                if not self._is_journal(os.path.join(d, i))
+            ]
+
+    def _is_journal(self, path: str) -> bool:
+        """ Journals of storages of the path are not values """
+        path = os.path.abspath(path)
+        journal = self._expiry.journal
+        if journal and path in (journal, journal + '.tmp'):
+            return True
+        return os.path.basename(path).startswith(EXPIRY_JOURNAL) and \
+            os.path.dirname(path) == os.path.abspath(
+                str(self._expiry.storage._path))
+
+    def walk(self, root: Optional[Path] = None):
+        """ Yields paths of files of all values recursively,
+        it is blocking and runs in executor """
+        for d, files in self._walk(root or self._path.path):
+            for name in files:
+                path = os.path.join(d, name)
+                if not self.is_expired(path):
+                    yield Path(path)
+
+    def iter_paths(self, batch: int = 100):
+        """ Returns async iterator of lists of str paths of all values """
+        return AsyncWalk(self, batch)
 
     def path_transform(self, rel_path: str):
         return rel_path
@@ -333,21 +988,41 @@ class BaseFileSystemStorage(
             value = self.encode(value)
             await self.wait_free_space(len(value))
         k = self.raw_key(key).path
+        await self.reset_expiry(k)
         try:
-            await self.run_in_executor(self._write, k, value)
+            paths = await self.run_in_path_executor(
+                k, PRIORITY_NORMAL, self._write, k, value)
+            await self.commit(paths)
         except OSError as e:
             raise StorageError(str(e)) from e
         await self.next_space_waiter()
 
     async def get(self, key):
         k = self.raw_key(key)
-        if await k.exists():
+        if self.is_expired(k):
+            return None
+        elif await k.exists():
             v = await k.read_bytes()
             return self.decode(v)
 
     def open(self, key, *args, **kwargs):
         return self.raw_key(key).open(*args, **kwargs)
 
+    async def stream_path(self, key):
+        """ Returns path of file of value """
+        k = self.raw_key(key)
+        if not self.is_expired(k):
+            return k
+
+    def _commit_stream(self, source: str, key: Path):
+        return self._move_into(source, key)
+
+    def open_read(self, key, chunk_size=None):
+        return AsyncStreamReader(self, key, chunk_size)
+
+    def open_write(self, key):
+        return AsyncStreamWriter(self, key)
+
     def _copy(self, key_source, storage_dest, key_dest, copy_func):
         s = self.raw_key(key_source).path
         d = storage_dest.raw_key(key_dest).path
@@ -363,14 +1038,16 @@ class BaseFileSystemStorage(
 
     def copy(self, key_source, storage_dest, key_dest):
         if isinstance(storage_dest, FileSystemStorage):
-            return self.run_in_executor(
+            return self.run_in_path_executor(
+                self.raw_key(key_source), PRIORITY_NORMAL,
                 self._copy, key_source,
                 storage_dest, key_dest, shutil.copy)
         return super().copy(key_source, storage_dest, key_dest)
 
     def move(self, key_source, storage_dest, key_dest):
         if isinstance(storage_dest, FileSystemStorage):
-            return self.run_in_executor(
+            return self.run_in_path_executor(
+                self.raw_key(key_source), PRIORITY_NORMAL,
                 self._copy, key_source,
                 storage_dest, key_dest, shutil.move)
         return super().move(key_source, storage_dest, key_dest)
@@ -391,17 +1068,109 @@ class FileSystemStorage(
         BaseFileSystemStorage,
         base.AbstractListedStorage):
 
+    def _list(self, base, paths):
+        return [
+            p.relative_to(base) for p in paths
+            if not self._is_journal(str(p)) and not self.is_expired(p)
+        ]
+
     def list(self, glob='*'):
         base = self._path
         g = base.path.glob(glob)
-        return self.run_in_executor(
-            list, map(lambda x: x.relative_to(base), g)
-        )
+        return self.run_in_path_executor(
+            base, PRIORITY_HIGH, self._list, base, g)
+
+    def iter_keys(self, batch: int = 100):
+        """ Returns async iterator of lists of keys
+        of all nested paths unlike list """
+        return AsyncWalk(self, batch, root=str(self._path))
 
     async def length(self, glob='*'):
         return len(await self.list(glob))
 
 
+class FieldFileSystemStorage(base.FieldStorageMixin, FileSystemStorage):
+    """ Keeps every field of value in own file in directory of key,
+    so field is read and written without others
+    and write of field does not lock key.
+    config:
+        path: str
+        format: format of every field
+    """
+
+    def _field_name(self, field) -> str:
+        name = str(field)
+        if not name or name.startswith('.') or os.sep in name:
+            raise ValueError('Bad field name {!r}'.format(field))
+        return name
+
+    def _read_fields(self, path: Path, fields):
+        if not path.is_dir():
+            return None
+        elif fields is None:
+            fields = [p.name for p in path.iterdir()]
+        result = {}
+        for f in fields:
+            try:
+                result[f] = path.joinpath(self._field_name(f)).read_bytes()
+            except FileNotFoundError:
+                raise KeyError(f)
+        return result
+
+    def _write_fields(self, path: Path, fields, replace=False):
+        to_sync = []  # type: List[Path]
+        if path.is_file() or replace and path.exists():
+            to_sync += self._delete(path)
+        for f, value in fields.items():
+            to_sync += self._write(path.joinpath(self._field_name(f)), value)
+        return to_sync
+
+    def walk(self, root: Optional[Path] = None):
+        """ Yields paths of directories of values """
+        for d, files in self._walk(root or self._path.path):
+            if files and not self.is_expired(d):
+                yield Path(d)
+
+    async def _store(self, key, fields, replace=False):
+        k = self.raw_key(key).path
+        await self.reset_expiry(k)
+        fields = {f: self.encode(v) for f, v in fields.items()}
+        try:
+            paths = await self.run_in_path_executor(
+                k, PRIORITY_NORMAL, self._write_fields, k, fields, replace)
+            await self.commit(paths)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+    async def get_fields(self, key, fields):
+        k = self.raw_key(key)
+        if self.is_expired(k):
+            return None
+        raw = await self.run_in_path_executor(
+            k, PRIORITY_NORMAL, self._read_fields, k.path, fields)
+        if raw is None:
+            return None
+        m = self.model()
+        for f, v in raw.items():
+            m[f] = self.decode(v)
+        return m
+
+    async def set_fields(self, key, fields):
+        await self._store(key, fields)
+
+    async def get(self, key, *, field=None, fields=None):
+        if field or fields:
+            return await super().get(key, field=field, fields=fields)
+        return await self.get_fields(key, None)
+
+    async def set(self, key, value, *, field=None, fields=None):
+        if field or fields or value is None:
+            return await super().set(
+                key, value, field=field, fields=fields)
+        async with self.field_lock(key):
+            await self._store(key, value, replace=True)
+
+
 class NestedFileSystemStorage(BaseFileSystemStorage):
     def path_transform(self, rel_path: str):
         return os.path.join(rel_path[:2], rel_path[2:4], rel_path)
@@ -414,3 +1183,149 @@ class HashFileSystemStorage(NestedFileSystemStorage):
         hash.update(rel_path.encode())
         d = hash.hexdigest() + ext
         return super().path_transform(d)
+
+
+class ContentHashFileSystemStorage(HashFileSystemStorage):
+    """ Deduplicating storage. Every value is stored once
+    under the hash of its content, keys refer to it by hash.
+    config:
+        path: str
+        hash: str name of hashlib algorithm, default sha256
+    """
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._hash = self.config.get('hash', 'sha256')
+        hashlib.new(self._hash)
+        self._refs_lock = threading.Lock()
+
+    def path_transform(self, rel_path: str):
+        return os.path.join('keys', super().path_transform(rel_path))
+
+    def walk(self, root: Optional[Path] = None):
+        """ Yields paths of keys, objects are not values """
+        return super().walk(root or self._path.path.joinpath('keys'))
+
+    def object_path(self, digest: str) -> Path:
+        return self._path.path.joinpath(
+            'objects', digest[:2], digest[2:4], digest)
+
+    def _ref(self, digest: str, delta: int,
+             value=None, source=None) -> list:
+        obj = self.object_path(digest)
+        refs = obj.with_suffix('.refs')
+        if refs.exists():
+            count = int(refs.read_bytes())
+        else:
+            count = 0
+        count += delta
+        to_sync = []  # type: List[Path]
+        if count > 0:
+            if obj.exists():
+                if source is not None:
+                    os.unlink(source)
+            elif value is not None:
+                to_sync += self._write(obj, value)
+            elif source is not None:
+                to_sync += self._move_into(source, obj)
+            to_sync += self._write(refs, str(count).encode())
+        else:
+            to_sync += self._write(obj, None)
+            to_sync += self._write(refs, None)
+        return to_sync
+
+    def _link(self, key: Path, digest, value=None, source=None):
+        to_sync = []  # type: List[Path]
+        with self._refs_lock:
+            old = key.read_text() if key.is_file() else None
+            if digest == old:
+                if source is not None:
+                    os.unlink(source)
+                return to_sync
+            if digest is not None:
+                to_sync += self._ref(digest, 1, value, source)
+                to_sync += self._write(key, digest.encode())
+            else:
+                to_sync += self._write(key, None)
+            if old:
+                to_sync += self._ref(old, -1)
+        return to_sync
+
+    def _expire(self, path: Path):
+        return self._link(path, None)
+
+    def _set(self, key: Path, value):
+        digest = None
+        if value is not None:
+            digest = hashlib.new(self._hash, value).hexdigest()
+        return self._link(key, digest, value=value)
+
+    def _commit_stream(self, source: str, key: Path):
+        h = hashlib.new(self._hash)
+        with open(source, 'rb') as f:
+            for chunk in iter(partial(f.read, 1 << 20), b''):
+                h.update(chunk)
+        return self._link(key, h.hexdigest(), source=source)
+
+    def _read_digest(self, key: Path):
+        try:
+            return key.read_text()
+        except FileNotFoundError:
+            return None
+
+    async def stream_path(self, key):
+        k = self.raw_key(key)
+        if self.is_expired(k):
+            return None
+        digest = await self.run_in_path_executor(
+            k, PRIORITY_HIGH, self._read_digest, k.path)
+        if digest:
+            return AsyncPath(self.object_path(digest), storage=self)
+
+    def _get(self, key: Path):
+        try:
+            digest = key.read_text()
+            return self.object_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def set(self, key, value):
+        if value is not None:
+            value = self.encode(value)
+            await self.wait_free_space(len(value))
+        k = self.raw_key(key).path
+        await self.reset_expiry(k)
+        try:
+            paths = await self.run_in_path_executor(
+                k, PRIORITY_NORMAL, self._set, k, value)
+            await self.commit(paths)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+        await self.next_space_waiter()
+
+    async def get(self, key):
+        k = self.raw_key(key).path
+        if self.is_expired(k):
+            return None
+        v = await self.run_in_path_executor(
+            k, PRIORITY_NORMAL, self._get, k)
+        if v is not None:
+            return self.decode(v)
+
+    def open(self, key, mode='rb', **kwargs):
+        """ Objects are shared by keys, so they are read in place
+        and written to temporary file like open_write """
+        if mode == 'wb':
+            return self.open_write(key)
+        elif mode in ('r', 'rb'):
+            return AsyncStreamFile(self, key, mode, **kwargs)
+        raise ValueError(
+            'Content addressed storage does not support mode ' + mode)
+
+    def copy(self, key_source, storage_dest, key_dest):
+        return base.AbstractStreamReadOnly.copy(
+            self, key_source, storage_dest, key_dest)
+
+    def move(self, key_source, storage_dest, key_dest):
+        return base.AbstractStorage.move(
+            self, key_source, storage_dest, key_dest)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from abc import abstractmethod
 from typing import Mapping, Sequence
@@ -18,7 +19,7 @@ class StorageDataFormatError(StorageError):
 
 
 class AbstractHttpStorage(
-    FormattedEntity, LoggingEntity, base.AbstractStorageReadOnly,
+    FormattedEntity, LoggingEntity, base.AbstractStreamReadOnly,
 ):
     """ ReadOnly storage over http GET
     config:
@@ -105,30 +106,43 @@ class AbstractHttpStorage(
         url = self.raw_key(key)
         return self.request(url)
 
-    async def copy(self, key_source, storage_dest, key_dest):
-        """ Return True if data are copied
-        * optimized for http->fs copy
-        * not supported return_status
-        """
-        from aioworkers.storage.filesystem import FileSystemStorage
-        if not isinstance(storage_dest, FileSystemStorage):
-            return super().copy(key_source, storage_dest, key_dest)
-        url = self.raw_key(key_source)
-        async with self.session(url, method='get') as response:
-            if response.status == 404:
-                return
-            elif response.status >= 400:
-                if self.logger.getEffectiveLevel() == logging.DEBUG:
-                    self.logger.debug(
-                        'HttpStorage request to %s '
-                        'returned code %s:\n%s' % (
-                            url, response.status,
-                            (await response.read()).decode()))
-                return
-            async with storage_dest.raw_key(key_dest).open('wb') as f:
-                async for chunk in response.content.iter_any():
-                    await f.write(chunk)
-                return True
+    def open_read(self, key, chunk_size=None):
+        return HttpStreamReader(self, self.raw_key(key), chunk_size)
+
+    async def _log_error(self, url, response):
+        if self.logger.getEffectiveLevel() == logging.DEBUG:
+            self.logger.debug(
+                'HttpStorage request to %s '
+                'returned code %s:\n%s' % (
+                    url, response.status,
+                    (await response.read()).decode()))
+
+
+class HttpStreamReader:
+    def __init__(self, storage, url, chunk_size=None):
+        self._storage = storage
+        self._url = url
+        self._chunk_size = chunk_size or 1 << 16
+        self._request = None
+
+    async def __aenter__(self):
+        self._request = self._storage.session.request(self._url)
+        try:
+            response = await self._request.__aenter__()
+        except Exception as e:
+            raise StorageError() from e
+        if response.status == 404:
+            return
+        elif response.status >= 400:
+            await self._storage._log_error(self._url, response)
+            await self._request.__aexit__(None, None, None)
+            raise StorageError(
+                'Request to {} returned code {}'.format(
+                    self._url, response.status))
+        return response.iter_chunks(self._chunk_size)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._request.__aexit__(exc_type, exc_val, exc_tb)
 
 
 class RoStorage(ExecutorEntity, AbstractHttpStorage):
@@ -146,7 +160,7 @@ class RoStorage(ExecutorEntity, AbstractHttpStorage):
             raise StorageError() from e
 
 
-class Storage(RoStorage, base.AbstractStorageWriteOnly):
+class Storage(RoStorage, base.AbstractStreamWriteOnly):
     """ RW storage over http
     config:
         conn_limit: int
@@ -157,8 +171,14 @@ class Storage(RoStorage, base.AbstractStorageWriteOnly):
         headers: Mapping or None
         format: [json|str|bytes], default json
         set: [post|put|patch], default post
+
+    open_write sends body with chunked transfer encoding
+    and holds one of conn_limit connections until it exits
     """
 
+    def open_write(self, key, maxsize=4):
+        return HttpStreamWriter(self, self.raw_key(key), maxsize)
+
     def set(self, key, value):
         url = self.raw_key(key)
         data = self.encode(value)
@@ -169,3 +189,81 @@ class Storage(RoStorage, base.AbstractStorageWriteOnly):
         return self.request(
             url, method=self.config.get('set', 'post'),
             data=data, headers=headers)
+
+
+class HttpStreamWriter:
+    """ Feeds request body from executor thread by chunks
+    which are put to bounded queue in loop
+    """
+
+    def __init__(self, storage, url, maxsize=4):
+        self._storage = storage
+        self._url = url
+        self._maxsize = maxsize
+        self._queue = None
+        self._future = None
+
+    def _body(self):
+        loop = self._storage.loop
+        while True:
+            chunk = asyncio.run_coroutine_threadsafe(
+                self._queue.get(), loop).result()
+            if chunk is None:
+                return
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    async def _send(self):
+        request = self._storage.session.request(
+            self._url, method=self._storage.config.get('set', 'post'),
+            data=self._body(),
+            headers={'Content-Type': 'application/octet-stream'})
+        async with request as response:
+            if response.status >= 400:
+                await self._storage._log_error(self._url, response)
+                raise StorageError(
+                    'Request to {} returned code {}'.format(
+                        self._url, response.status))
+
+    async def _put(self, item):
+        put = asyncio.ensure_future(
+            self._queue.put(item), loop=self._storage.loop)
+        await asyncio.wait(
+            [put, self._future], loop=self._storage.loop,
+            return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self._future.result()
+            raise StorageError('Request to {} finished before body'.format(
+                self._url))
+
+    async def __aenter__(self):
+        loop = self._storage.loop
+        self._queue = asyncio.Queue(self._maxsize, loop=loop)
+        self._future = asyncio.ensure_future(self._send(), loop=loop)
+        return self
+
+    async def write(self, data):
+        if self._future.done():
+            self._future.result()
+            raise StorageError('Request to {} finished before body'.format(
+                self._url))
+        await self._put(bytes(data))
+        return len(data)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self._put(None)
+            try:
+                await self._future
+            except StorageError:
+                raise
+            except Exception as e:
+                raise StorageError() from e
+            return
+        try:
+            await self._put(exc_val or StorageError())
+            await self._future
+        except Exception:
+            pass
@@ -0,0 +1,197 @@
+import collections
+import heapq
+import itertools
+import sys
+import time
+from typing import Any, Hashable
+
+from . import base
+
+__all__ = (
+    'MemoryStorage',
+)
+
+
+class LRUPolicy:
+    def __init__(self):
+        self._keys = collections.OrderedDict()
+
+    def add(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+
+    def touch(self, key):
+        self._keys.move_to_end(key)
+
+    def remove(self, key):
+        del self._keys[key]
+
+    def victim(self):
+        return next(iter(self._keys))
+
+
+class LFUPolicy:
+    """ O(1) LFU, least recently used key between least frequently used """
+
+    def __init__(self):
+        self._freq = {}
+        self._buckets = collections.defaultdict(collections.OrderedDict)
+        self._min = 0
+
+    def add(self, key):
+        if key in self._freq:
+            return self.touch(key)
+        self._freq[key] = 1
+        self._buckets[1][key] = None
+        self._min = 1
+
+    def touch(self, key):
+        freq = self._freq[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min == freq:
+                self._min = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets[freq + 1][key] = None
+
+    def remove(self, key):
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min == freq and self._buckets:
+                self._min = min(self._buckets)
+
+    def victim(self):
+        return next(iter(self._buckets[self._min]))
+
+
+class MemoryStorage(
+        base.AbstractListedStorage,
+        base.AbstractExpiryStorage):
+    """ Process local storage with bounded size
+    config:
+        max_items: int, default unlimited
+        max_size: int or str size of values in bytes, default unlimited
+        eviction: [lru|lfu], default lru
+    """
+    policies = {
+        'lru': LRUPolicy,
+        'lfu': LFUPolicy,
+    }
+
+    def __init__(self, *args, **kwargs):
+        self._data = {}
+        self._sizes = {}
+        self._deadlines = {}
+        self._expires = []
+        self._counter = itertools.count()
+        self._size = 0
+        self.counter = collections.Counter()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._max_items = self.config.get_int('max_items', null=True)
+        self._max_size = self.config.get_size('max_size', null=True)
+        eviction = self.config.get('eviction', 'lru')
+        if eviction not in self.policies:
+            raise ValueError('Unknown eviction {!r}'.format(eviction))
+        self._policy = self.policies[eviction]()
+
+    def raw_key(self, key: Any) -> Hashable:
+        return key
+
+    def sizeof(self, value) -> int:
+        if isinstance(value, (bytes, bytearray, str, memoryview)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def _remove(self, key):
+        del self._data[key]
+        self._size -= self._sizes.pop(key)
+        self._deadlines.pop(key, None)
+        self._policy.remove(key)
+
+    def _purge_expired(self, now=None):
+        if not self._expires:
+            return
+        now = now or time.monotonic()
+        expires = self._expires
+        while expires and expires[0][0] <= now:
+            deadline, _, key = heapq.heappop(expires)
+            if self._deadlines.get(key) == deadline:
+                self._remove(key)
+                self.counter['expired'] += 1
+
+    def _evict(self, size):
+        """ Free space for new value of size """
+        while self._data and (
+            self._max_items is not None and
+            len(self._data) >= self._max_items or
+            self._max_size is not None and
+            self._size + size > self._max_size
+        ):
+            self._remove(self._policy.victim())
+            self.counter['evicted'] += 1
+
+    async def get(self, key):
+        key = self.raw_key(key)
+        self._purge_expired()
+        if key not in self._data:
+            self.counter['miss'] += 1
+            return None
+        self.counter['hit'] += 1
+        self._policy.touch(key)
+        return self._data[key]
+
+    async def set(self, key, value):
+        key = self.raw_key(key)
+        self._purge_expired()
+        if key in self._data:
+            self._remove(key)
+        if value is None:
+            return
+        size = self.sizeof(value)
+        if self._max_size is not None and size > self._max_size:
+            self.counter['evicted'] += 1
+            return
+        self._evict(size)
+        self._data[key] = value
+        self._sizes[key] = size
+        self._size += size
+        self._policy.add(key)
+
+    async def expiry(self, key, expiry):
+        """ Set time to live in seconds, None removes expiry """
+        key = self.raw_key(key)
+        if key not in self._data:
+            return
+        elif expiry is None:
+            self._deadlines.pop(key, None)
+            return
+        deadline = time.monotonic() + expiry
+        self._deadlines[key] = deadline
+        heapq.heappush(
+            self._expires, (deadline, next(self._counter), key))
+        if expiry <= 0:
+            self._purge_expired()
+
+    async def list(self):
+        self._purge_expired()
+        return list(self._data)
+
+    async def length(self):
+        self._purge_expired()
+        return len(self._data)
+
+    async def status(self):
+        self._purge_expired()
+        return {
+            'items': len(self._data),
+            'size': self._size,
+            **self.counter,
+        }
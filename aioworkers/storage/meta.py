@@ -1,8 +1,40 @@
+import asyncio
+import bisect
+import collections
+import hashlib
 import weakref
-from itertools import cycle
 from typing import Any, Hashable
 
-from . import base
+from ..core.base import LoggingEntity
+from . import StorageError, base
+
+
+class BackgroundMixin(LoggingEntity):
+    """ Runs tasks in background and waits them on context stop """
+
+    def __init__(self, *args, **kwargs):
+        self._tasks = set()
+        super().__init__(*args, **kwargs)
+
+    async def init(self):
+        await super().init()
+        self.context.on_stop.append(self.stop)
+
+    async def stop(self):
+        while self._tasks:
+            await asyncio.wait(list(self._tasks), loop=self.loop)
+
+    def _background(self, coro):
+        task = asyncio.ensure_future(coro, loop=self.loop)
+        self._tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            self.logger.error(
+                'Background error', exc_info=task.exception())
 
 
 class AbstractMetaListStorage(base.AbstractStorage):
@@ -14,34 +46,338 @@ class AbstractMetaListStorage(base.AbstractStorage):
         return map(lambda x: self.context[x], self.config.storages)
 
 
-class Fallback(AbstractMetaListStorage):
+class Fallback(BackgroundMixin, AbstractMetaListStorage):
+    """ Reads storages in order until value is found
+    config:
+        storages: list of str paths to storages
+        hedge: duration to wait answer of storage
+            before reading the next one too, default wait answer.
+            First not None value wins and other reads are cancelled
+        backfill: bool write found value to previous storages
+    """
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._hedge = self.config.get_duration('hedge', null=True)
+        self._backfill = self.config.get_bool('backfill', False)
+
+    async def _fill(self, storages, key, value):
+        for storage in storages:
+            if isinstance(storage, base.AbstractStorageWriteOnly):
+                await storage.set(key, value)
+
     async def get(self, key):
         key = self.raw_key(key)
-        for storage in self.storages:
-            v = await storage.get(key)
-            if v is not None:
-                return v
+        storages = list(self.storages)
+        tiers = {}
+        pending = set()
+        error = None
+        hedged = False
+        try:
+            while True:
+                if len(tiers) < len(storages) and (not pending or hedged):
+                    t = asyncio.ensure_future(
+                        storages[len(tiers)].get(key), loop=self.loop)
+                    tiers[t] = len(tiers)
+                    pending.add(t)
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, loop=self.loop,
+                    timeout=self._hedge if len(tiers) < len(storages)
+                    else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                hedged = not done
+                for t in sorted(done, key=tiers.get):
+                    if t.exception() is not None:
+                        error = t.exception()
+                        continue
+                    v = t.result()
+                    if v is None:
+                        continue
+                    elif self._backfill and tiers[t]:
+                        self._background(
+                            self._fill(storages[:tiers[t]], key, v))
+                    return v
+        finally:
+            for t in pending:
+                t.cancel()
+        if error is not None:
+            raise error
 
     async def set(self, key, value):
         pass
 
 
-class Replicator(AbstractMetaListStorage):
-    async def init(self):
-        self._pool = cycle(self.storages)
+class Replicator(BackgroundMixin, AbstractMetaListStorage):
+    """ Writes to all storages concurrently, reads from the fastest
+    config:
+        storages: list of str paths to storages
+        w: int count of acknowledged writes to return from set,
+            default all. Other writes are finished in background
+        r: int count of storages read concurrently, default 1.
+            Get returns first not None value
+        error_timeout: duration to skip storage after error, default 5
+        alpha: float smoothing factor of read latency EWMA, default 0.3.
+            Storage without read latency is read first to measure it
+        half_life: duration to halve old read latency, default 60
+        probe: int every probe get also reads one of other storages
+            in background to refresh its latency, default 10, 0 is off
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._latency = {}
+        self._errors = {}
+        self._reads = 0
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._w = self.config.get_int('w', null=True)
+        self._r = self.config.get_int('r', 1)
+        self._error_timeout = self.config.get_duration('error_timeout', 5)
+        self._alpha = self.config.get_float('alpha', 0.3)
+        self._half_life = self.config.get_duration('half_life', 60)
+        self._probe = self.config.get_int('probe', 10)
+
+    def latency(self, name, now=None):
+        """ Read latency of storage decayed by age or None """
+        sample = self._latency.get(name)
+        if sample is None:
+            return None
+        latency, measured = sample
+        if now is None:
+            now = self.loop.time()
+        if self._half_life:
+            latency *= 0.5 ** ((now - measured) / self._half_life)
+        return latency
+
+    async def _call(self, name, method, *args):
+        storage = self.context[name]
+        start = self.loop.time()
+        try:
+            result = await getattr(storage, method)(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._errors[name] = self.loop.time()
+            raise
+        self._errors.pop(name, None)
+        if method == 'get':
+            now = self.loop.time()
+            latency = now - start
+            prev = self.latency(name, now)
+            if prev is not None:
+                latency = prev + self._alpha * (latency - prev)
+            self._latency[name] = latency, now
+        return result
+
+    def ranked(self):
+        """ Names of storages ordered by read latency,
+        recently failed storages are skipped """
+        names = list(self.config.storages)
+        now = self.loop.time()
+        healthy = [
+            n for n in names
+            if n not in self._errors or
+            now - self._errors[n] >= self._error_timeout
+        ]
+        return sorted(
+            healthy or names, key=lambda n: self.latency(n, now) or 0)
+
+    async def _probe_read(self, name, key):
+        try:
+            await self._call(name, 'get', key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+
+    def _probe_others(self, ranked, key):
+        self._reads += 1
+        others = ranked[self._r:]
+        if not self._probe or not others or self._reads % self._probe:
+            return
+        name = others[self._reads // self._probe % len(others)]
+        self._background(self._probe_read(name, key))
+
+    async def get(self, key):
+        key = self.raw_key(key)
+        ranked = self.ranked()
+        self._probe_others(ranked, key)
+        error = None
+        for i in range(0, len(ranked), self._r):
+            answered = False
+            tasks = [
+                asyncio.ensure_future(
+                    self._call(name, 'get', key), loop=self.loop)
+                for name in ranked[i:i + self._r]
+            ]
+            try:
+                for f in asyncio.as_completed(tasks, loop=self.loop):
+                    try:
+                        v = await f
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        error = e
+                        continue
+                    if v is not None:
+                        return v
+                    answered = True
+            finally:
+                for t in tasks:
+                    t.cancel()
+            if answered:
+                return None
+        raise StorageError('All replicas failed') from error
+
+    async def set(self, key, value):
+        key = self.raw_key(key)
+        names = list(self.config.storages)
+        w = min(self._w or len(names), len(names))
+        pending = {
+            asyncio.ensure_future(
+                self._call(name, 'set', key, value), loop=self.loop)
+            for name in names
+        }
+        acks = failed = 0
+        error = None
+        try:
+            while pending and acks < w:
+                done, pending = await asyncio.wait(
+                    pending, loop=self.loop,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        acks += 1
+                    else:
+                        failed += 1
+                        error = t.exception()
+                if len(names) - failed < w:
+                    raise StorageError(
+                        'Write quorum {} is not reached'.format(w)
+                    ) from error
+        finally:
+            for t in pending:
+                self._background(t)
+
+
+class Sharded(AbstractMetaListStorage):
+    """ Partitions keys between storages by consistent hashing
+    config:
+        storages: list of str paths to storages
+        vnodes: int count of points of every storage on ring, default 100
+    """
+
+    def set_config(self, config):
+        super().set_config(config)
+        if not self.config.get('storages'):
+            raise ValueError('Sharded needs storages')
+        vnodes = self.config.get_int('vnodes', 100)
+        ring = sorted(
+            (self.hash('{}#{}'.format(name, i)), name)
+            for name in self.config.storages
+            for i in range(vnodes)
+        )
+        self._points = [p for p, _ in ring]
+        self._names = [n for _, n in ring]
+
+    @staticmethod
+    def hash(key) -> int:
+        if not isinstance(key, bytes):
+            key = str(key).encode()
+        return int.from_bytes(hashlib.md5(key).digest()[:8], 'big')
+
+    def shard(self, key) -> str:
+        """ Returns name of storage for key """
+        i = bisect.bisect(self._points, self.hash(key))
+        return self._names[i % len(self._names)]
+
+    def _group(self, keys):
+        groups = collections.OrderedDict()
+        for i, key in enumerate(keys):
+            groups.setdefault(self.shard(key), []).append(i)
+        return groups
 
     async def get(self, key):
-        storage = next(self._pool)
         key = self.raw_key(key)
-        return await storage.get(key)
+        return await self.context[self.shard(key)].get(key)
 
     async def set(self, key, value):
         key = self.raw_key(key)
-        for storage in self.storages:
-            await storage.set(key, value)
+        await self.context[self.shard(key)].set(key, value)
+
+    async def get_many(self, keys):
+        keys = [self.raw_key(k) for k in keys]
+        groups = self._group(keys)
+        values = await asyncio.gather(*(
+            self.context[name].get_many([keys[i] for i in positions])
+            for name, positions in groups.items()
+        ), loop=self.loop)
+        result = [None] * len(keys)
+        for positions, vals in zip(groups.values(), values):
+            for i, v in zip(positions, vals):
+                result[i] = v
+        return result
+
+    async def set_many(self, items):
+        items = [(self.raw_key(k), v) for k, v in items]
+        groups = self._group([k for k, v in items])
+        await asyncio.gather(*(
+            self.context[name].set_many([items[i] for i in positions])
+            for name, positions in groups.items()
+        ), loop=self.loop)
+
+    async def rebalance(self, storages=None, batch=100):
+        """ Moves keys to their storages after storage is added.
+        storages: names of listed storages to scan, default all
+        Returns count of moved keys
+        """
+        moved = 0
+        for name in storages or self.config.storages:
+            storage = self.context[name]
+            if not isinstance(storage, base.AbstractListedStorage):
+                continue
+            async for keys in storage.iter_keys(batch):
+                chunk = [k for k in keys if self.shard(k) != name]
+                if not chunk:
+                    continue
+                values = await storage.get_many(chunk)
+                await self.set_many(zip(chunk, values))
+                await storage.set_many((k, None) for k in chunk)
+                moved += len(chunk)
+        return moved
+
 
+class Cache(BackgroundMixin, base.AbstractStorage):
+    """ Read through cache
+    config:
+        storage: str path to cache storage
+        source: str path to source storage
+        ttl: duration, expiry of written values
+            if storage is AbstractExpiryStorage
+        negative_ttl: duration to remember missing values, default off
+        refresh: duration, age of value when get returns it
+            and reloads it from source in background
+        write_back: [sync|async], async does not wait writing to storage
+        max_tracked: int count of keys with known load time, default 65536
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._loading = {}
+        self._loaded = collections.OrderedDict()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._ttl = self.config.get_duration('ttl', null=True)
+        self._negative_ttl = self.config.get_duration(
+            'negative_ttl', null=True)
+        self._refresh = self.config.get_duration('refresh', null=True)
+        self._write_async = self.config.get('write_back', 'sync') == 'async'
+        self._max_tracked = self.config.get_int('max_tracked', 1 << 16)
 
-class Cache(base.AbstractStorage):
     def raw_key(self, key):
         return key
 
@@ -53,50 +389,295 @@ class Cache(base.AbstractStorage):
     def source(self):
         return self.context[self.config.source]
 
-    async def get(self, key):
-        key = self.raw_key(key)
-        v = await self.storage.get(key)
-        if v is not None:
-            return v
+    def _track(self, key, negative=False):
+        negative = negative and bool(self._negative_ttl)
+        if not self._refresh and not negative:
+            self._loaded.pop(key, None)
+            return
+        self._loaded[key] = self.loop.time(), negative
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > self._max_tracked:
+            self._loaded.popitem(last=False)
+
+    async def _write(self, key, value):
+        storage = self.storage
+        await storage.set(key, value)
+        if value is not None and self._ttl and \
+                isinstance(storage, base.AbstractExpiryStorage):
+            await storage.expiry(key, self._ttl)
+
+    async def _fetch(self, key, refresh=False):
         v = await self.source.get(key)
-        await self.storage.set(key, v)
+        self._track(key, v is None)
+        if v is None and not refresh:
+            return v
+        elif self._write_async:
+            self._background(self._write(key, v))
+        else:
+            await self._write(key, v)
         return v
 
-    def set(self, key, value):
+    def _load(self, key, refresh=False):
+        task = self._loading.get(key)
+        if task is None:
+            task = self.loop.create_task(self._fetch(key, refresh))
+            self._loading[key] = task
+            task.add_done_callback(lambda t: self._loading.pop(key, None))
+        return task
+
+    async def get(self, key):
+        key = self.raw_key(key)
+        loaded_at, negative = self._loaded.get(key, (None, False))
+        now = self.loop.time()
+        if negative and now < loaded_at + self._negative_ttl:
+            return None
+        elif not negative:
+            v = await self.storage.get(key)
+            if v is not None:
+                if self._refresh and loaded_at is not None and \
+                        now - loaded_at >= self._refresh and \
+                        key not in self._loading:
+                    self._background(self._load(key, refresh=True))
+                return v
+        return await asyncio.shield(self._load(key), loop=self.loop)
+
+    async def set(self, key, value):
+        key = self.raw_key(key)
+        self._track(key)
+        await self._write(key, value)
+
+
+class WriteBehind(BackgroundMixin, base.AbstractStorage):
+    """ Buffers and coalesces writes to storage,
+    writes batches by set_many of storage
+    config:
+        storage: str path to storage
+        max_items: int count of buffered keys to flush, default 1000
+        interval: duration between flushes, default 1
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._buffer = collections.OrderedDict()
+        self._flushing = {}
+        self._flush_task = None
+        self._timer = None
+        self.counter = collections.Counter()
+        super().__init__(*args, **kwargs)
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._max_items = self.config.get_int('max_items', 1000)
+        self._interval = self.config.get_duration('interval', 1)
+
+    async def init(self):
+        await super().init()
+        if self._interval:
+            self._timer = self.loop.create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        await super().stop()
+
+    def raw_key(self, key):
+        return key
+
+    @property
+    def storage(self):
+        return self.context[self.config.storage]
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self._interval, loop=self.loop)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception('Flush error')
+
+    async def _write(self, batch):
+        try:
+            await self.storage.set_many(batch.items())
+        except BaseException:
+            for k, v in batch.items():
+                self._buffer.setdefault(k, v)
+            raise
+        self.counter['flushed'] += len(batch)
+        self.counter['batches'] += 1
+
+    def _flush_done(self, task):
+        if self._flush_task is task:
+            self._flush_task = None
+            self._flushing = {}
+
+    async def flush(self):
+        while self._flush_task is not None:
+            await asyncio.wait([self._flush_task], loop=self.loop)
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, collections.OrderedDict()
+        self._flushing = batch
+        task = self.loop.create_task(self._write(batch))
+        self._flush_task = task
+        task.add_done_callback(self._flush_done)
+        await asyncio.shield(task, loop=self.loop)
+
+    async def get(self, key):
+        key = self.raw_key(key)
+        if key in self._buffer:
+            return self._buffer[key]
+        elif key in self._flushing:
+            return self._flushing[key]
+        return await self.storage.get(key)
+
+    async def set(self, key, value):
         key = self.raw_key(key)
-        return self.storage.set(key, value)
+        if key in self._buffer:
+            self.counter['coalesced'] += 1
+        self._buffer[key] = value
+        if len(self._buffer) < self._max_items:
+            pass
+        elif self._flush_task is None:
+            self._background(self.flush())
+        elif len(self._buffer) >= 2 * self._max_items:
+            await self.flush()
+
+    async def status(self):
+        return {
+            'buffered': len(self._buffer),
+            **self.counter,
+        }
 
 
 class FutureStorage(base.AbstractStorage):
+    """ Rendezvous of get and set by key,
+    get returns future of value which is resolved by set
+    config:
+        weak: bool keep future only while it is referenced, default true
+        exists_set: bool set of resolved key replaces value
+        timeout: duration default timeout of get, default unlimited
+        max_items: int limit of kept futures, oldest is evicted
+            and its waiters are cancelled. In weak mode it limits
+            values which are set before get, otherwise they are dropped
+    """
+
     def __init__(self, *args, **kwargs):
-        self._futures = {}
+        self._futures = collections.OrderedDict()
+        self._unclaimed = collections.OrderedDict()
+        self._weak = False
+        self._timeout = None
+        self._max_items = None
+        self._waiters = 0
+        self.counter = collections.Counter()
         super().__init__(*args, **kwargs)
 
     def set_config(self, config):
         super().set_config(config)
-        if self.config.get('weak', True):
+        self._weak = self.config.get_bool('weak', True)
+        if self._weak:
             self._futures = weakref.WeakValueDictionary()
+        self._timeout = self.config.get_duration('timeout', null=True)
+        self._max_items = self.config.get_int('max_items', null=True)
 
     def raw_key(self, key: Any) -> Hashable:
         return key
 
+    def _evict(self, futures):
+        while self._max_items is not None and len(futures) > self._max_items:
+            _, future = futures.popitem(last=False)
+            future.cancel()
+            self.counter['evicted'] += 1
+
+    def _keep(self, key, future):
+        if self._weak:
+            self._futures[key] = future
+        else:
+            self._futures[key] = future
+            self._futures.move_to_end(key)
+            self._evict(self._futures)
+
+    def _future(self, key) -> asyncio.Future:
+        future = self._futures.get(key)
+        if future is None:
+            future = self._unclaimed.pop(key, None)
+            if future is None:
+                future = self.loop.create_future()
+            self._keep(key, future)
+        return future
+
     async def set(self, key: Hashable, value: Any) -> None:
         raw_key = self.raw_key(key)
-        if raw_key not in self._futures:
+        future = self._futures.get(raw_key)
+        if future is None:
+            future = self._unclaimed.get(raw_key)
+        claimed = future is not None
+        if not claimed:
             pass
-        elif not self._futures[raw_key].done():
-            self._futures[raw_key].set_result(value)
+        elif not future.done():
+            future.set_result(value)
             return None
         elif not self.config.get('exists_set'):
             return None
         future = self.loop.create_future()
-        self._futures[raw_key] = future
         future.set_result(value)
-
-    def get(self, key):
-        key = self.raw_key(key)
-        if key in self._futures:
-            return self._futures[key]
+        if not self._weak:
+            self._keep(raw_key, future)
+        elif self._max_items:
+            self._futures.pop(raw_key, None)
+            self._unclaimed[raw_key] = future
+            self._unclaimed.move_to_end(raw_key)
+            self._evict(self._unclaimed)
         else:
-            return self._futures.setdefault(
-                key, self.loop.create_future())
+            self._futures[raw_key] = future
+            if not claimed:
+                self.counter['dropped'] += 1
+
+    async def _wait(self, futures, timeout):
+        pending = [f for f in futures if not f.done()]
+        if pending:
+            self._waiters += len(pending)
+            try:
+                await asyncio.wait(pending, timeout=timeout, loop=self.loop)
+            finally:
+                self._waiters -= len(pending)
+            if not all(f.done() for f in pending):
+                self.counter['timeout'] += 1
+                raise asyncio.TimeoutError()
+        return [f.result() for f in futures]
+
+    async def _get(self, future, timeout):
+        result, = await self._wait([future], timeout)
+        return result
+
+    def get(self, key, timeout=None):
+        """ Returns future of value.
+        With timeout future raises asyncio.TimeoutError
+        but value stays awaited by other getters """
+        future = self._future(self.raw_key(key))
+        if timeout is None:
+            timeout = self._timeout
+        if timeout is None or future.done():
+            return future
+        return asyncio.ensure_future(
+            self._get(future, timeout), loop=self.loop)
+
+    async def get_many(self, keys, timeout=None):
+        """ Waits values of all keys with one timer,
+        returns list of values in order of keys """
+        futures = [self._future(self.raw_key(key)) for key in keys]
+        if timeout is None:
+            timeout = self._timeout
+        return await self._wait(futures, timeout)
+
+    async def status(self):
+        futures = list(self._futures.values())
+        return {
+            'items': len(futures),
+            'pending': sum(not f.done() for f in futures),
+            'waiters': self._waiters,
+            'unclaimed': len(self._unclaimed),
+            **self.counter,
+        }
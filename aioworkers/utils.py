@@ -2,9 +2,11 @@ import contextlib
 import functools
 import importlib.util
 import logging
+import os
 import pickle
 import struct
 import sys
+import tempfile
 import time
 from pathlib import Path
 from typing import Mapping
@@ -117,6 +119,13 @@ def monkey_close(loop):
         close()
 
 
+def shm_path():
+    """ Directory for files shared in memory by processes """
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
 def try_read(n, fd, timeout=1):
     result = None
     while n:
@@ -1,11 +1,18 @@
 import asyncio
 import collections
 import datetime
+import itertools
+import time
 from abc import abstractmethod
 from functools import partial
 
 from ..core.base import AbstractNamedEntity, LoggingEntity
+from ..core.config import ValueExtractor
+from ..core.rate import token_bucket
+from ..queue.base import AbstractAckQueue, AbstractQueue
+from ..queue.timeout import TimestampQueue
 from ..utils import import_name
+from .limiter import AdaptiveLimiter, Limiter
 
 
 class AbstractWorker(LoggingEntity, AbstractNamedEntity):
@@ -32,8 +39,46 @@ class Worker(AbstractWorker):
             sleep: int time in seconds for sleep between rerun
             sleep_start: int time in seconds for sleep before run
             crontab: str rule as cron. Every 5 minutes "*/5 * * * *"
-            input: str.path to instance of AbstractReader
+            input: str.path to instance of AbstractReader,
+                value of AbstractAckQueue is acknowledged
+                after result is put to output
+                and is returned to queue on error without retry
             output: str.path to instance of AbstractWriter
+            batch: run gets list of values from input
+                size: int max count of values
+                timeout: duration of waiting values after first one
+                result which is list is put to output by put_many
+            concurrency: int count of runs in flight for values of input
+            ordered: bool put results to output in order of input,
+                default false
+            adaptive: true or mapping, limit of runs in flight
+                is adjusted by latency and errors of run up to concurrency
+                min: int least limit, default 1
+                initial: int limit at start, default concurrency
+                backoff: float factor of decrease on overload, default 0.9
+                tolerance: float ratio of latency to least latency
+                    which is overload, default 2
+            retry: mapping, value of input which run fails with
+                is run again after delay, by one besides input.
+                Value of AbstractAckQueue stays reserved until then.
+                attempts: int count of runs, default 3
+                delay: duration before second run, default 1
+                factor: float multiplier of delay, default 2
+                max_delay: duration, default unlimited
+                dead_letter: str.path to instance of AbstractWriter
+                    for values which all runs failed,
+                    such values are dropped without dead_letter
+                Failed put to output fails the run too,
+                so run is repeated for its value.
+                Retries are kept in memory, stop waits retry in flight
+                unless force and returns values waiting for retry
+                to AbstractAckQueue, values of other input are dropped,
+                so they are run at most once across restarts.
+            rate: rate of runs for values of input, like 100/s or 5/m,
+                run of batch takes token for every value,
+                tokens of batch over first value are waited by next batch
+            burst: int count of runs over rate after idle, default 1
+            rate_shared: str name of rate shared by processes of host
     """
     _crontab = None
     _sleep = None
@@ -43,6 +88,17 @@ class Worker(AbstractWorker):
     _is_sleep = None
     _future = None
     _persist = False
+    _batch_size = None
+    _batch_timeout = None
+    _concurrency = 1
+    _ordered = False
+    _getting = None
+    _limiter = None
+    _retry = None
+    _retries = None
+    _retrier = None
+    _retrying = False
+    _bucket = None
 
     def set_config(self, config):
         super().set_config(config)
@@ -57,9 +113,32 @@ class Worker(AbstractWorker):
         self._sleep_start = self.config.get_duration(
             'sleep_start', default=None, null=True
         )
+        self._concurrency = self.config.get_int('concurrency', default=1)
+        self._ordered = self.config.get_bool('ordered', default=False)
+        batch = self.config.get('batch')
+        if batch:
+            self._batch_size = batch.get_int('size', default=100)
+            self._batch_timeout = batch.get_duration(
+                'timeout', default=None, null=True)
+        retry = self.config.get('retry')
+        if retry:
+            self._retry = dict(
+                attempts=retry.get_int('attempts', default=3),
+                delay=retry.get_duration('delay', default=1),
+                factor=retry.get_float('factor', default=2),
+                max_delay=retry.get_duration(
+                    'max_delay', default=None, null=True),
+                dead_letter=retry.get('dead_letter'),
+            )
 
     async def init(self):
         self.counter = collections.Counter()
+        self._inflight = set()
+        if self._retry is not None and self._retries is None:
+            self._retries = TimestampQueue(
+                ValueExtractor({}), context=self.context, loop=self.loop)
+            self._sequence = itertools.count()
+            await self._retries.init()
 
         if self.config.get('run'):
             run = import_name(self.config.run)
@@ -85,17 +164,244 @@ class Worker(AbstractWorker):
     def output(self):
         return self.context[self.config.get('output')]
 
+    async def get_batch(self):
+        get_many = getattr(self.input, 'get_many', None)
+        if get_many is None:
+            get_many = partial(AbstractQueue.get_many, self.input)
+        return await get_many(self._batch_size, self._batch_timeout)
+
+    async def put_batch(self, values):
+        put_many = getattr(self.output, 'put_many', None)
+        if put_many is None:
+            put_many = partial(AbstractQueue.put_many, self.output)
+        await put_many(values)
+
+    async def get_input(self):
+        if self._batch_size:
+            return await self.get_batch()
+        return await self.input.get()
+
+    async def reserve_input(self):
+        """ Returns tags of reserved values or None and value """
+        bucket = self._bucket
+        if bucket is None:
+            return await self._reserve_input()
+        await bucket.acquire()
+        try:
+            tags, value = await self._reserve_input()
+        except asyncio.CancelledError:
+            bucket.refund()
+            raise
+        if self._batch_size and len(value) > 1:
+            # tokens of rest of batch are waited by next reserve
+            bucket.reserve(len(value) - 1)
+        return tags, value
+
+    async def _reserve_input(self):
+        input = self.input
+        if not isinstance(input, AbstractAckQueue):
+            return None, await self.get_input()
+        elif self._batch_size:
+            items = await input.reserve_many(
+                self._batch_size, self._batch_timeout)
+            return [t for t, v in items], [v for t, v in items]
+        tag, value = await input.reserve()
+        return [tag], value
+
+    async def settle(self, tags, done=True):
+        """ Acknowledges values of input or returns them to input """
+        if not tags:
+            return
+        elif done:
+            await asyncio.gather(
+                *map(self.input.ack, tags), loop=self.loop)
+        else:
+            for tag in reversed(tags):
+                await self.input.nack(tag)
+
+    async def put_output(self, result):
+        if self.output is None:
+            pass
+        elif self._batch_size and isinstance(result, list):
+            await self.put_batch(result)
+        else:
+            await self.output.put(result)
+
+    @property
+    def dead_letter(self):
+        if self._retry is not None:
+            return self.context[self._retry['dead_letter']]
+
+    async def fail(self, tags, value, attempt=1):
+        """ Schedules next run of value which run failed,
+        puts value to dead_letter after last run """
+        retry = self._retry
+        if retry is None:
+            await self.settle(tags, False)
+            return
+        elif attempt < retry['attempts']:
+            delay = retry['delay'] * retry['factor'] ** (attempt - 1)
+            if retry['max_delay'] is not None:
+                delay = min(delay, retry['max_delay'])
+            entry = next(self._sequence), attempt + 1, tags, value
+            await self._retries.put(entry, time.time() + delay)
+            self.counter['retry'] += 1
+            return
+        dead_letter = self.dead_letter
+        if dead_letter is None:
+            self.counter['dropped'] += 1
+        elif self._batch_size and isinstance(value, list):
+            await dead_letter.put_many(value)
+            self.counter['dead_letter'] += 1
+        else:
+            await dead_letter.put(value)
+            self.counter['dead_letter'] += 1
+        await self.settle(tags)
+
+    async def attempt(self, tags, value, attempt=1):
+        """ Runs value, returns False if run failed """
+        try:
+            if attempt > 1 and self._bucket is not None:
+                # first run takes tokens in reserve_input
+                await self._bucket.acquire(
+                    len(value) if self._batch_size and
+                    isinstance(value, list) else 1)
+            self.counter['run'] += 1
+            result = await self.run(value)
+            self.counter['done'] += 1
+            await self.put_output(result)
+        except asyncio.CancelledError:
+            await self.settle(tags, False)
+            raise
+        except BaseException:
+            self._log_error()
+            await self.fail(tags, value, attempt)
+            return False
+        await self.settle(tags)
+        return True
+
+    async def retrier(self):
+        """ Runs values which are due until stop """
+        while self._retrier is not None:
+            _, attempt, tags, value = await self._retries.get()
+            self._retrying = True
+            try:
+                await self.attempt(tags, value, attempt)
+            finally:
+                self._retrying = False
+
+    async def stop_retrier(self, force=True):
+        """ Stops retrier after retry in flight unless force,
+        then returns values waiting for retry to input """
+        retrier, self._retrier = self._retrier, None
+        if retrier is None:
+            return
+        elif force or not self._retrying:
+            retrier.cancel()
+        await asyncio.wait([retrier], loop=self.loop)
+        for _, attempt, tags, value in self._retries.clear():
+            if tags:
+                await self.settle(tags, False)
+            else:
+                self.counter['retry_dropped'] += 1
+
+    def _log_error(self):
+        self.counter['error'] += 1
+        self.logger.exception('ERROR {} {}'.format(
+            self.name,
+            self.config.get('run', type(self)),
+        ))
+
     async def work(self):
         self._is_sleep = False
         if self.input is not None:
-            args = (await self.input.get(),)
-        else:
-            args = ()
+            tags, value = await self.reserve_input()
+            await self.attempt(tags, value)
+            return
         self.counter['run'] += 1
-        result = await self.run(*args)
+        result = await self.run()
         self.counter['done'] += 1
-        if self.output is not None:
-            await self.output.put(result)
+        await self.put_output(result)
+
+    def limiter_factory(self):
+        adaptive = self.config.get('adaptive')
+        if not adaptive:
+            return Limiter(self._concurrency, loop=self.loop)
+        elif adaptive is True:
+            adaptive = ValueExtractor({})
+        return AdaptiveLimiter(
+            adaptive.get_int('initial', default=self._concurrency),
+            min_limit=adaptive.get_int('min', default=1),
+            max_limit=self._concurrency,
+            backoff=adaptive.get_float('backoff', default=0.9),
+            tolerance=adaptive.get_float('tolerance', default=2.0),
+            loop=self.loop,
+        )
+
+    async def _process(self, tags, value, previous, limiter):
+        latency = None
+        error = False
+        done = False
+        try:
+            self.counter['run'] += 1
+            started = self.loop.time()
+            result = await self.run(value)
+            latency = self.loop.time() - started
+            self.counter['done'] += 1
+            if previous is not None:
+                await asyncio.wait([previous], loop=self.loop)
+            await self.put_output(result)
+            done = True
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            error = True
+            self._log_error()
+            if previous is not None:
+                await asyncio.wait([previous], loop=self.loop)
+        finally:
+            limiter.release(latency, error)
+            if error:
+                await self.fail(tags, value)
+            else:
+                await self.settle(tags, done)
+
+    async def pipeline(self):
+        """ Keeps up to concurrency runs in flight,
+        returns when persist is off and runs are done """
+        self._is_sleep = False
+        limiter = self._limiter = self.limiter_factory()
+        inflight = self._inflight
+        previous = None
+        try:
+            while self._persist:
+                await limiter.acquire()
+                if not self._persist:
+                    limiter.release()
+                    break
+                self._getting = asyncio.ensure_future(
+                    self.reserve_input(), loop=self.loop)
+                try:
+                    tags, value = await self._getting
+                except asyncio.CancelledError:
+                    limiter.release()
+                    if self._persist:
+                        raise
+                    break
+                finally:
+                    self._getting = None
+                task = asyncio.ensure_future(
+                    self._process(tags, value, previous, limiter),
+                    loop=self.loop)
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                if self._ordered:
+                    previous = task
+            if inflight:
+                await asyncio.wait(list(inflight), loop=self.loop)
+        finally:
+            for task in list(inflight):
+                task.cancel()
 
     async def runner(self):
         self._is_sleep = True
@@ -109,15 +415,14 @@ class Worker(AbstractWorker):
                         loop=self.loop,
                     )
                 try:
-                    await self.work()
+                    if self._concurrency > 1 and self.input is not None:
+                        await self.pipeline()
+                    else:
+                        await self.work()
                 except asyncio.CancelledError:
                     raise
                 except BaseException:
-                    self.counter['error'] += 1
-                    self.logger.exception('ERROR {} {}'.format(
-                        self.name,
-                        self.config.get('run', type(self)),
-                    ))
+                    self._log_error()
                 self._is_sleep = True
                 if not self._persist:
                     return
@@ -152,9 +457,22 @@ class Worker(AbstractWorker):
         if not self.running():
             self._started_at = datetime.datetime.now()
             self._stopped_at = None
+            self._bucket = token_bucket(self.config, loop=self.loop)
             self._future = self.loop.create_task(self.runner())
+            if self._retries is not None:
+                self._retrier = self.loop.create_task(self.retrier())
 
     async def stop(self, force=True):
+        await self._stop(force)
+        self._close_bucket()
+
+    def _close_bucket(self):
+        if self._bucket is not None:
+            self._bucket.close()
+            self._bucket = None
+
+    async def _stop(self, force):
+        """ Stops runner and retrier """
         if not self.running():
             pass
         elif force or self._is_sleep:
@@ -166,14 +484,22 @@ class Worker(AbstractWorker):
                 pass
         else:
             self._persist = False
+            if self._getting is not None:
+                self._getting.cancel()
             await self._future
         self._is_sleep = None
+        await self.stop_retrier(force)
 
     async def status(self):
-        return {
+        status = {
             'started_at': self.started_at,
             'stopped_at': self.stopped_at,
             'running': self.running(),
             'is_sleep': self._is_sleep,
+            'inflight': len(self._inflight),
+            'retries': len(self._retries or ()),
             **self.counter,
         }
+        if self._limiter is not None:
+            status['limit'] = int(self._limiter.limit)
+        return status
@@ -0,0 +1,91 @@
+import asyncio
+import collections
+
+
+class Limiter:
+    """ Limit of concurrent tasks, like semaphore
+    which release takes result of task to adjust limit
+    """
+
+    def __init__(self, limit, *, loop=None):
+        self.limit = limit
+        self.inflight = 0
+        self._loop = loop
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        if not self._waiters and self.inflight < int(self.limit):
+            self.inflight += 1
+            return
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.inflight -= 1
+                self._wake()
+            raise
+
+    def release(self, latency=None, error=False):
+        self.inflight -= 1
+        self.update(latency, error)
+        self._wake()
+
+    def update(self, latency, error):
+        pass
+
+    def _wake(self):
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+
+class AdaptiveLimiter(Limiter):
+    """ AIMD limit. Baseline is the least latency,
+    which drifts to greater latencies by alpha.
+    Task with error or latency above tolerance * baseline is overload,
+    it decreases limit by backoff factor once per limit of tasks.
+    Other tasks increase limit by one per limit of tasks.
+    Release without latency and error does not change limit.
+
+    >>> limiter = AdaptiveLimiter(4, min_limit=1)
+    >>> for _ in range(8):
+    ...     limiter.update(1, False)
+    >>> limiter.update(10, False)
+    >>> int(limiter.limit)
+    3
+    """
+
+    def __init__(
+        self, limit, *, min_limit=1, max_limit=None,
+        backoff=0.9, tolerance=2.0, alpha=0.01, loop=None,
+    ):
+        super().__init__(limit, loop=loop)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.alpha = alpha
+        self.baseline = None
+        self._since_decrease = limit
+
+    def update(self, latency, error):
+        if latency is None and not error:
+            return
+        if latency is None:
+            pass
+        elif self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += self.alpha * (latency - self.baseline)
+        self._since_decrease += 1
+        if error or latency is not None and \
+                latency > self.tolerance * self.baseline:
+            if self._since_decrease >= self.limit:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._since_decrease = 0
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
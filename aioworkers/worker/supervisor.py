@@ -11,11 +11,15 @@ class Supervisor(Worker):
     config:
         children: int - count
         child: Mapping - config for child worker
+        rate: rate of values got by children from input,
+            shared by children
+        attach: bool child with index i gets values from sub queue i
+            of input, like PartitionQueue or BroadcastQueue
     """
     async def init(self):
         self.context.on_stop.append(self.stop)
         self._children = [
-            self.create_child() for _ in range(self.config.children)
+            self.create_child(i) for i in range(self.config.children)
         ]
         await super().init()
         await self._wait(lambda w: w.init())
@@ -27,10 +31,14 @@ class Supervisor(Worker):
     def get_child_config(self):
         return self.config.child
 
-    def create_child(self):
+    def create_child(self, index=0):
         conf = self.get_child_config()
         add = {}
-        if not conf.get('input') and self.input is not None:
+        if conf.get('input'):
+            pass
+        elif self.config.get_bool('attach', default=False):
+            add['input'] = '{}.{}'.format(self.config.input, index)
+        elif self.input is not None:
             add['input'] = self.name
         if not conf.get('output') and self.output is not None:
             add['output'] = self.name
@@ -43,6 +51,8 @@ class Supervisor(Worker):
         return cls(conf, context=self.context, loop=self.loop)
 
     async def get(self):
+        if self._bucket is not None:
+            await self._bucket.acquire()
         return await self.input.get()
 
     async def put(self, *args, **kwargs):
@@ -65,8 +75,10 @@ class Supervisor(Worker):
             children = [i for i in self._children if i._future in d]
 
     async def stop(self, force=False):
-        await super().stop(force=True)
+        await self._stop(force=True)
+        # children get values through bucket until they are stopped
         await self._wait(lambda w: w.stop(force=force))
+        self._close_bucket()
 
     async def status(self):
         status = await super().status()
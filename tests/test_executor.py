@@ -0,0 +1,39 @@
+import threading
+import time
+
+import pytest
+
+from aioworkers.core.executor import (
+    PRIORITY_HIGH, PRIORITY_NORMAL, PriorityThreadPoolExecutor
+)
+
+
+def test_priority():
+    executor = PriorityThreadPoolExecutor(max_workers=1)
+    event = threading.Event()
+    result = []
+    executor.submit(event.wait)
+    futures = [
+        executor.submit_priority(PRIORITY_NORMAL, result.append, 1),
+        executor.submit_priority(PRIORITY_NORMAL, result.append, 2),
+        executor.submit_priority(PRIORITY_HIGH, result.append, 3),
+    ]
+    status = executor.status()
+    assert 3 <= status['queue']
+    event.set()
+    for f in futures:
+        f.result(timeout=1)
+    assert result == [3, 1, 2]
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(time.time)
+
+
+async def test_loop(loop):
+    executor = PriorityThreadPoolExecutor(max_workers=2)
+    high = executor.with_priority(PRIORITY_HIGH)
+    assert 4 == await loop.run_in_executor(high, sum, [2, 2])
+    with pytest.raises(ZeroDivisionError):
+        await loop.run_in_executor(executor, divmod, 1, 0)
+    assert 2 == executor.status()['calls']
+    executor.shutdown()
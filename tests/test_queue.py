@@ -1,5 +1,7 @@
+import asyncio
+
 from aioworkers.core.config import MergeDict
-from aioworkers.queue.base import Queue, ScoreQueue
+from aioworkers.queue.base import Queue, ScoreQueue, collect
 
 
 async def test_queue(loop):
@@ -34,3 +36,46 @@ async def test_score_time(loop):
     assert a2 == 4
     assert t1 < t2
     assert not q
+
+
+async def test_many(loop):
+    q = Queue({}, loop=loop)
+    await q.init()
+    await q.put_many(range(5))
+    assert [0, 1, 2] == await q.get_many(3)
+    assert [3, 4] == await q.get_many(3)
+
+    loop.call_later(0.01, q.put_nowait, 5)
+    assert [5] == await q.get_many(3)
+    await q.put(6)
+    loop.call_later(0.01, q.put_nowait, 7)
+    assert [6, 7] == await q.get_many(3, timeout=0.1)
+
+    await q.put_many([8, 9])
+    getter = loop.create_task(q.get_many(3, timeout=1))
+    await asyncio.sleep(0.01, loop=loop)
+    getter.cancel()
+    await asyncio.wait([getter], loop=loop)
+    await q.put(10)
+    assert [8, 9, 10] == await q.get_many(3)
+
+    restored = []
+    getter = loop.create_task(
+        collect(loop, q.get, 3, timeout=1, restore=restored.extend))
+    await q.put(11)
+    await asyncio.sleep(0.01, loop=loop)
+    getter.cancel()
+    await asyncio.wait([getter], loop=loop)
+    assert [11] == restored
+
+    await q.put_many([12, 13, 14, 15])
+    assert [12, 13, 14] == await collect(loop, q.get, 3)
+    loop.call_later(0.01, q.put_nowait, 16)
+    assert [15] == await collect(loop, q.get, 3)
+    assert [16] == await q.get_many(3)
+
+    q = ScoreQueue({}, loop=loop)
+    await q.init()
+    await q.put(1, 2)
+    await q.put(2, 1)
+    assert [2, 1] == await q.get_many(3)
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import time
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+
+
+def disk_config(path, **kwargs):
+    return Config(q=dict(
+        cls='aioworkers.queue.disk.DiskQueue',
+        path=str(path),
+        **kwargs
+    ))
+
+
+async def test_ack(loop, tmp_path):
+    config = disk_config(tmp_path, redelivery_delay=0)
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        await q.put(1)
+        await q.put_many([2, 3])
+        assert 3 == len(q)
+        tag, value = await q.reserve()
+        assert 1 == value
+        await q.ack(tag)
+        tag, value = await q.reserve()
+        assert 2 == value
+        await q.nack(tag)
+        assert [2, 3] == [v for t, v in await q.reserve_many(3, 0.01)]
+        status = await q.status()
+        assert status['reserved'] == 2
+        assert status['ack'] == 1
+        assert status['nack'] == 1
+
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        assert 2 == await q.get()
+        assert 3 == await q.get()
+        assert not len(q)
+
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        assert not len(q)
+        await q.put(4)
+        assert 4 == await q.get()
+
+
+async def test_torn_tail(loop, tmp_path):
+    config = disk_config(tmp_path)
+    async with Context(config, loop=loop) as context:
+        await context.q.put_many(['a', 'b'])
+
+    segment, = [i for i in os.listdir(str(tmp_path)) if i.endswith('.seg')]
+    path = os.path.join(str(tmp_path), segment)
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        f.truncate(size - 1)
+
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        assert 1 == len(q)
+        await q.put('c')
+        assert 'a' == await q.get()
+        assert 'c' == await q.get()
+
+
+async def test_segments(loop, tmp_path):
+    config = disk_config(tmp_path, segment_size=100, sync=False, maxsize=20)
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        for i in range(20):
+            await q.put(b'x' * 40)
+        assert (await q.status())['segments'] > 5
+        putter = loop.create_task(q.put(b'y'))
+        await asyncio.sleep(0.01, loop=loop)
+        assert not putter.done()
+        for i in range(20):
+            await q.get()
+        await putter
+        assert b'y' == await q.get()
+        assert 1 == (await q.status())['segments']
+    segments = [i for i in os.listdir(str(tmp_path)) if i.endswith('.seg')]
+    assert 1 == len(segments)
+
+
+async def test_worker(loop, mocker, tmp_path):
+    seen = []
+
+    async def myrun(worker, value):
+        seen.append(value)
+        if seen.count(value) == 1 and value == 2:
+            raise ValueError(value)
+        return value
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q=dict(cls='aioworkers.queue.disk.DiskQueue', path=str(tmp_path)),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q', output='q_out',
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q.put_many(range(4))
+        result = []
+        while len(result) < 4:
+            result.append(await context.q_out.get())
+        assert [0, 1, 3, 2] == result  # 2 is delayed after nack
+        assert [0, 1, 2, 3, 2] == seen
+        await asyncio.sleep(0.01, loop=loop)
+        assert 4 == (await context.q.status())['ack']
+
+
+async def test_benchmark(loop, tmp_path, record_property):
+    count = int(os.environ.get('BENCHMARK_ITEMS', 1000))
+    config = disk_config(tmp_path, commit_window=0.001)
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        t = time.monotonic()
+        await asyncio.gather(*(q.put(i) for i in range(count)), loop=loop)
+        items = await q.reserve_many(count, 1)
+        await asyncio.gather(*(q.ack(t) for t, v in items), loop=loop)
+        status = await q.status()
+        assert status['ack'] == count
+        assert status['batches'] < count / 10
+        record_property('rate', count / (time.monotonic() - t))
+
+
+async def test_redelivery(loop, tmp_path):
+    config = disk_config(
+        tmp_path, redelivery_delay=0.01, redelivery_max_delay=0.02)
+    async with Context(config, loop=loop) as context:
+        q = context.q
+        await q.put_many([1, 2])
+        tag, value = await q.reserve()
+        await q.nack(tag)
+        assert 1 == (await q.status())['delayed']
+        assert 2 == await q.get()
+        for delay in 0.01, 0.02, 0.02:
+            t = loop.time()
+            tag, value = await q.reserve()
+            assert 1 == value
+            assert loop.time() - t >= delay * 0.9
+            await q.nack(tag)
+
+        getter = loop.create_task(q.reserve_many(3, timeout=1))
+        await asyncio.sleep(0.05, loop=loop)
+        await q.put(3)
+        await asyncio.sleep(0.01, loop=loop)
+        getter.cancel()
+        await asyncio.wait([getter], loop=loop)
+        assert [1, 3] == [v for t, v in await q.reserve_many(3)]
+        assert not (await q.status())['delayed']
+
+        await q.stop()
+        await q.put(4)
+    async with Context(config, loop=loop) as context:
+        assert [1, 3, 4] == [v for t, v in await context.q.reserve_many(3)]
+
+
+async def test_worker_retry(loop, mocker, tmp_path):
+    seen = []
+
+    async def myrun(worker, value):
+        seen.append(value)
+        raise ValueError(value)
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q=dict(cls='aioworkers.queue.disk.DiskQueue', path=str(tmp_path)),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q', retry=dict(attempts=2, delay=1),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q.put(1)
+        await asyncio.sleep(0.01, loop=loop)
+        assert [1] == seen
+        assert 1 == (await context.q.status())['reserved']
+        assert 1 == (await context.w.status())['retries']
+    assert 1 == (await context.q.status())['nack']
+
+    async with Context(config, loop=loop) as context:
+        await asyncio.sleep(0.01, loop=loop)
+        assert [1, 1] == seen
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+
+
+def key(value):
+    return value['user']
+
+
+async def run(worker, value):
+    return worker.name, value
+
+
+@pytest.fixture
+def config_yaml():
+    return """
+    block:
+        cls: aioworkers.queue.fanout.BroadcastQueue
+        subscribers: [a, b]
+        maxsize: 1
+    drop_new:
+        cls: aioworkers.queue.fanout.BroadcastQueue
+        subscribers: 2
+        maxsize: 2
+        policy: drop_new
+    drop_old:
+        cls: aioworkers.queue.fanout.BroadcastQueue
+        subscribers: 1
+        maxsize: 2
+        policy: drop_old
+    pq:
+        cls: aioworkers.queue.fanout.PartitionQueue
+        partitions: 4
+        key: tests.test_queue_fanout.key
+    """
+
+
+async def test_broadcast(context):
+    q = context.block
+    await q.put(1)
+    assert 1 == await context['block.a'].get()
+    putter = context.loop.create_task(q.put(2))
+    await asyncio.sleep(0.01, loop=context.loop)
+    assert not putter.done()
+    assert 1 == await context['block.b'].get()
+    await putter
+    assert 2 == await q.b.get()
+    with pytest.raises(AttributeError):
+        q.c
+    with pytest.raises(KeyError):
+        q['0']
+    assert ['a', 'b'] == sorted((await q.status()))
+
+    q = context.drop_new
+    await q.put_many(range(3))
+    assert [0, 1] == await q['0'].get_many(3)
+    assert 1 == (await q.status())['1']['dropped']
+
+    q = context.drop_old
+    await q.put_many(range(3))
+    assert [1, 2] == await q['0'].get_many(3)
+
+
+async def test_partition(context):
+    q = context.pq
+    values = [{'user': u, 'n': n} for n in range(3) for u in 'abcdef']
+    await q.put_many(values)
+    assert sum((await q.status()).values()) == len(values)
+    seen = {}
+    for i in range(4):
+        sub = q[str(i)]
+        while len(sub):
+            v = await sub.get()
+            assert seen.setdefault(v['user'], [i, -1])[0] == i
+            assert seen[v['user']][1] == v['n'] - 1
+            seen[v['user']][1] = v['n']
+    assert len(seen) == 6
+
+    await q.put(1, key='a')
+    assert 1 == await q[str(q.partition('a'))].get()
+
+
+async def test_supervisor(loop):
+    config = Config(
+        pq=dict(cls='aioworkers.queue.fanout.PartitionQueue', partitions=2),
+        out=dict(cls='aioworkers.queue.base.Queue'),
+        sv=dict(
+            cls='aioworkers.worker.supervisor.Supervisor',
+            autorun=True, attach=True, children=2,
+            input='pq', output='out',
+            child=dict(
+                cls='aioworkers.worker.base.Worker',
+                run='tests.test_queue_fanout.run',
+            ),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        assert context.sv._children[1].input is context.pq['1']
+        for i in range(10):
+            await context.pq.put(i)
+        result = []
+        for _ in range(10):
+            result.append(await asyncio.wait_for(
+                context.out.get(), 1, loop=loop))
+        assert list(range(10)) == sorted(v for n, v in result)
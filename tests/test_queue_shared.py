@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+
+
+def shared_config(path, **kwargs):
+    return Config(q=dict(
+        cls='aioworkers.queue.shared.SharedQueue',
+        path=str(path),
+        **kwargs
+    ))
+
+
+async def test_attach(loop, tmp_path):
+    config = shared_config(tmp_path, size=64)
+    async with Context(config, loop=loop) as c1, \
+            Context(config, loop=loop) as c2:
+        await c1.q.put(1)
+        assert 1 == len(c2.q)
+        assert 1 == await c2.q.get()
+        with pytest.raises(asyncio.QueueEmpty):
+            c1.q.get_nowait()
+        with pytest.raises(ValueError):
+            await c1.q.put(b'1' * 64)
+
+        getter = loop.create_task(c2.q.get())
+        await asyncio.sleep(0.01, loop=loop)
+        await c1.q.put('a')
+        assert 'a' == await asyncio.wait_for(getter, 0.05, loop=loop)
+
+        values = [str(i) * i for i in range(1, 20)]
+
+        async def produce():
+            for v in values:
+                await c1.q.put(v)
+
+        producer = loop.create_task(produce())
+        result = []
+        for _ in values:
+            result.append(await asyncio.wait_for(c2.q.get(), 1, loop=loop))
+        await producer
+        assert values == result
+        status = await c1.q.status()
+        assert status['size'] == 0
+        assert status['capacity'] == 64
+
+
+async def test_default_name(loop, tmp_path):
+    queue = dict(cls='aioworkers.queue.shared.SharedQueue', path=str(tmp_path))
+    async with Context(Config(a=queue, b=queue), loop=loop) as context:
+        await context.a.put(1)
+        assert 1 == len(context.a)
+        assert 0 == len(context.b)
+    assert (tmp_path / 'a.ring').exists()
+
+
+def produce(path, count):
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        async with Context(shared_config(path, size=256), loop=loop) as ctx:
+            for i in range(count):
+                await ctx.q.put(i)
+
+    loop.run_until_complete(run())
+    loop.close()
+
+
+async def test_processes(loop, tmp_path):
+    count = 100
+    process = multiprocessing.get_context('fork').Process(
+        target=produce, args=(tmp_path, count))
+    config = shared_config(tmp_path, size=256)
+    async with Context(config, loop=loop) as context:
+        process.start()
+        result = []
+        for _ in range(count):
+            result.append(
+                await asyncio.wait_for(context.q.get(), 5, loop=loop))
+        assert list(range(count)) == result
+    process.join()
+    assert process.exitcode == 0
+
+
+def produce_slowly(path, count):
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        config = shared_config(path, poll=1)
+        async with Context(config, loop=loop) as ctx:
+            await asyncio.sleep(0.1, loop=loop)
+            for i in range(count):
+                await asyncio.sleep(0.03, loop=loop)
+                await ctx.q.put(time.time())
+
+    loop.run_until_complete(run())
+    loop.close()
+
+
+async def test_latency(loop, tmp_path):
+    count = 20
+    process = multiprocessing.get_context('fork').Process(
+        target=produce_slowly, args=(tmp_path, count))
+    config = shared_config(tmp_path, poll=1)
+    async with Context(config, loop=loop) as context:
+        process.start()
+        latency = []
+        for _ in range(count):
+            put_at = await asyncio.wait_for(context.q.get(), 5, loop=loop)
+            latency.append(time.time() - put_at)
+    process.join()
+    assert process.exitcode == 0
+    latency.sort()
+    assert latency[count // 2] < 0.01
+    assert latency[-2] < 0.025
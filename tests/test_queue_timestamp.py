@@ -1,6 +1,10 @@
 import asyncio
+import os
+import random
 import time
 
+import pytest
+
 from aioworkers.queue.timeout import TimestampQueue, UniqueQueue
 
 
@@ -35,6 +39,50 @@ async def test_put_unique(loop, mocker):
     assert not q
 
 
+async def test_unique_index(loop, mocker):
+    q = UniqueQueue({}, context=mocker.MagicMock(), loop=loop)
+    await q.init()
+    t = time.time()
+    for i in range(1000):
+        await q.put(i % 10, t - i)
+    assert 10 == len(q)
+    assert len(q._queue) < 100
+    assert 5 in q
+    assert q.remove(5)
+    assert not q.remove(5)
+    assert 5 not in q
+    for i in (9, 8, 7, 6, 4, 3, 2, 1, 0):
+        assert i == await q.get()
+    assert not q
+
+    f = q.get()
+    await q.put(1, t + 0.05)
+    await q.put(2, t + 10)
+    q.remove(1)
+    await q.put(2, t)
+    assert 2 == await asyncio.wait_for(f, 1, loop=loop)
+
+
+async def test_timestamp_many(loop, mocker):
+    q = TimestampQueue({}, context=mocker.MagicMock(), loop=loop)
+    await q.init()
+    t = time.time()
+    await q.put_many([1, 2])
+    await q.put(3, t + 0.02)
+    await q.put(4, t + 10)
+    assert [1, 2] == await q.get_many(5)
+    values = await q.get_many(5, timeout=0.05, score=True)
+    assert [3] == [v for v, s in values]
+    assert 1 == len(q)
+
+    await q.put(5, t)
+    getter = loop.create_task(q.get_many(5, timeout=1))
+    await asyncio.sleep(0.01, loop=loop)
+    getter.cancel()
+    await asyncio.wait([getter], loop=loop)
+    assert [(5, t)] == await q.get_many(5, score=True)
+
+
 async def test_timestamp_score(loop, mocker):
     q = TimestampQueue({}, context=mocker.MagicMock(), loop=loop)
     await q.init()
@@ -70,3 +118,35 @@ async def test_stop(loop, mocker):
     q.get()
     await q.put(1, 1)
     await q.stop()
+
+
+@pytest.mark.skipif(
+    'BENCHMARK_ITEMS' not in os.environ, reason='BENCHMARK_ITEMS is not set')
+async def test_benchmark(loop, mocker, record_property):
+    """ BENCHMARK_ITEMS=1000000 pytest -k benchmark --junitxml=bench.xml """
+    count = int(os.environ['BENCHMARK_ITEMS'])
+    q = TimestampQueue({}, context=mocker.MagicMock(), loop=loop)
+    await q.init()
+    t = time.time()
+    rnd = random.Random(0)
+    scores = [t - rnd.random() for _ in range(count)]
+
+    t0 = time.perf_counter()
+    for i, s in enumerate(scores):
+        await q.put(i, s)
+    t1 = time.perf_counter()
+    for _ in range(count):
+        await q.get()
+    t2 = time.perf_counter()
+    assert not q
+
+    waiters = [q.get() for _ in range(count)]
+    t3 = time.perf_counter()
+    for i, s in enumerate(scores):
+        await q.put(i, s)
+    await asyncio.wait(waiters, loop=loop)
+    t4 = time.perf_counter()
+    assert not q
+    record_property('put', count / (t1 - t0))
+    record_property('get', count / (t2 - t1))
+    record_property('put_to_waiters', count / (t4 - t3))
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+from aioworkers.core.rate import SharedTokenBucket, TokenBucket, token_bucket
+
+
+async def test_bucket(loop):
+    bucket = TokenBucket(100, burst=5, loop=loop)
+    started = loop.time()
+    for _ in range(15):
+        await bucket.acquire()
+    assert 0.09 <= loop.time() - started < 0.5
+
+    task = loop.create_task(bucket.acquire(10))
+    await asyncio.sleep(0, loop=loop)
+    task.cancel()
+    await asyncio.sleep(0.05, loop=loop)
+    assert bucket.reserve() == 0
+
+    now = 0
+    bucket = TokenBucket(10, burst=1, clock=lambda: now, loop=loop)
+    bucket.reserve(10)
+    now = 0.9
+    bucket.refund(9)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() > 0
+
+
+async def test_shared(loop, tmp_path):
+    path = str(tmp_path / 'b.rate')
+    b1 = SharedTokenBucket(10, burst=2, path=path, loop=loop)
+    b2 = SharedTokenBucket(10, burst=2, path=path, loop=loop)
+    assert 0 == b1.reserve()
+    assert 0 == b2.reserve()
+    assert 0 < b1.reserve() <= 0.1
+    assert 0.1 < b2.reserve() <= 0.2
+    b1.refund(10)
+    assert 0 == b2.reserve()
+    b1.close()
+    b2.close()
+    with pytest.raises(RuntimeError):
+        b1.reserve()
+    b1.refund()
+
+
+async def test_queue(loop, mocker):
+    async def myrun(worker, value):
+        return value
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q=dict(cls='aioworkers.queue.base.Queue'),
+        rq=dict(
+            cls='aioworkers.queue.rate.RateQueue',
+            queue='q', rate='50/s', burst=2,
+        ),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q', output='q_out',
+            rate='100/s',
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.w.stop()
+        await context.rq.put_many(range(6))
+        assert 6 == len(context.rq)
+        started = loop.time()
+        assert [0, 1, 2] == await context.rq.get_many(3)
+        assert 3 == await context.rq.get()
+        assert loop.time() - started >= 0.03
+
+        await context.w.start()
+        started = loop.time()
+        await context.q_out.get()
+        await context.q_out.get()
+        assert loop.time() - started >= 0.008
+        await context.w.stop()
+        assert context.w._bucket is None
+
+    with pytest.raises(ValueError):
+        token_bucket(Config(rate='0/s'))
+    assert token_bucket(Config()) is None
+
+
+async def test_batch(loop, mocker):
+    async def myrun(worker, values):
+        return values
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q=dict(cls='aioworkers.queue.base.Queue'),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker',
+            run='mocked.run', input='q', output='q_out',
+            batch=dict(size=5), rate='100/s',
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q.put_many(range(10))
+        started = loop.time()
+        await context.w.start()
+        for i in range(10):
+            assert i == await context.q_out.get()
+        assert loop.time() - started >= 0.04
@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+import pytest
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def config_yaml(tmp_dir):
+    return """
+    memory:
+      cls: aioworkers.storage.memory.MemoryStorage
+    bloom:
+      cls: aioworkers.storage.bloom.BloomFilterStorage
+      storage: memory
+      capacity: 10
+      path: {path}/bloom
+    fs:
+      cls: aioworkers.storage.filesystem.NestedFileSystemStorage
+      path: {path}
+    fs_bloom:
+      cls: aioworkers.storage.bloom.BloomFilterStorage
+      storage: fs
+    flat:
+      cls: aioworkers.storage.filesystem.FileSystemStorage
+      path: {path}/flat
+      tmp: {path}
+    flat_bloom:
+      cls: aioworkers.storage.bloom.BloomFilterStorage
+      storage: flat
+    future:
+      cls: aioworkers.storage.meta.FutureStorage
+    future_bloom:
+      cls: aioworkers.storage.bloom.BloomFilterStorage
+      storage: future
+    """.format(path=tmp_dir)
+
+
+async def test_rebuild(context, tmp_dir):
+    bloom = context.bloom
+    await bloom.stop()
+    assert (await bloom.status())['complete']
+    await context.memory.set('a', 1)
+    assert await bloom.get('a') is None  # written bypassing filter
+    await bloom.rebuild()
+    assert 1 == await bloom.get('a')
+    assert await bloom.get('b') is None
+    for i in range(100):
+        await bloom.set(str(i), i)
+        assert i == await bloom.get(str(i))
+    status = await bloom.status()
+    assert status['negative'] == 2
+    assert status['filters'] > 1
+    assert status['memory']
+
+    await bloom.stop()
+    assert os.path.exists(os.path.join(tmp_dir, 'bloom'))
+    await bloom.init()
+    assert not os.path.exists(os.path.join(tmp_dir, 'bloom'))
+    assert (await bloom.status())['complete']
+    assert 99 == await bloom.get('99')
+
+
+async def test_rebuild_walk(context):
+    await context.fs.set('a', b'1')
+    await context.flat.set('d/e/a', b'2')
+    for bloom in context.fs_bloom, context.flat_bloom:
+        await bloom.rebuild()
+        assert (await bloom.status())['complete']
+    assert b'1' == await context.fs_bloom.get('a')
+    assert await context.fs_bloom.get('b') is None
+    assert b'2' == await context.flat_bloom.get('d/e/a')
+    assert await context.flat_bloom.get('d/e/b') is None
+    assert 1 == (await context.flat_bloom.status())['items']
+
+
+async def test_not_listed(context):
+    bloom = context.future_bloom
+    await bloom.rebuild()
+    assert not (await bloom.status())['complete']
@@ -1,5 +1,8 @@
 import asyncio
+import os
 import tempfile
+import threading
+import time
 from pathlib import PurePath
 from unittest import mock
 
@@ -31,16 +34,43 @@ def config_yaml(tmp_dir):
       cls: aioworkers.storage.filesystem.HashFileSystemStorage
       path: {path}
       format: pickle
+    durable:
+      cls: aioworkers.storage.filesystem.FileSystemStorage
+      path: {path}
+      durability: fsync
+    group:
+      cls: aioworkers.storage.filesystem.FileSystemStorage
+      path: {path}
+      durability: group
+      commit_window: 0.01
+    cas:
+      cls: aioworkers.storage.filesystem.ContentHashFileSystemStorage
+      path: {path}
+      format: json
+    fields:
+      cls: aioworkers.storage.filesystem.FieldFileSystemStorage
+      format: json
+      path: {path}
     future:
       cls: aioworkers.storage.meta.FutureStorage
     exec1:
       cls: aioworkers.storage.filesystem.FileSystemStorage
       path: {path}
       executor: 1
+    sharded:
+      cls: aioworkers.storage.filesystem.FileSystemStorage
+      path: {path}
+      executor: 2
+      shards: 4
     exec_ext:
       cls: aioworkers.storage.filesystem.FileSystemStorage
       path: {path}
       executor: executor
+    expiring:
+      cls: aioworkers.storage.filesystem.FileSystemStorage
+      path: {path}/expiring
+      tmp: {path}
+      expiry_resolution: 0.01
     executor: null
     """.format(path=tmp_dir)
 
@@ -138,6 +168,85 @@ async def test_pickle(context):
     assert data == await storage.get(key)
 
 
+async def test_content_hash(context):
+    storage = context.cas
+    data = {'f': 3}
+    await storage.set('a', data)
+    await storage.set('b', data)
+    assert data == await storage.get('a')
+    assert data == await storage.get('b')
+    objects = list(storage._path.path.glob('objects/*/*/*'))
+    assert 2 == len(objects)  # value and refs
+
+    await storage.set('a', None)
+    assert await storage.get('a') is None
+    assert data == await storage.get('b')
+
+    await storage.set('b', [1])
+    assert [1] == await storage.get('b')
+    for p in objects:
+        assert not p.exists()
+
+    await storage.set('b', None)
+    assert not list(storage._path.path.glob('objects/*/*/*'))
+
+    async with storage.open('c', 'wb') as f:
+        await f.write(b'[2]')
+    async with storage.open('c') as f:
+        assert b'[2]' == await f.read()
+    with pytest.raises(FileNotFoundError):
+        async with storage.open('d'):
+            pass
+    with pytest.raises(ValueError):
+        storage.open('c', 'ab')
+
+
+async def test_durability(context, mocker):
+    fsync = mocker.patch('os.fsync')
+    await context.durable.set('1/2', b'1')
+    assert fsync.call_count == 3  # file, dir and created dir
+    assert b'1' == await context.durable.get('1/2')
+
+    fsync.reset_mock()
+    storage = context.group
+    await asyncio.gather(
+        storage.set('a/1', b'1'),
+        storage.set('a/2', b'2'),
+        storage.a.set('3', b'3'),
+        loop=context.loop,
+    )
+    assert fsync.call_count == 5  # 3 files, a and root
+    assert b'3' == await storage.get('a/3')
+
+    synced = []
+    mocker.patch(
+        'aioworkers.storage.filesystem.fsync_path',
+        lambda p: synced.append((str(p), os.path.isfile(str(p)))))
+    await asyncio.gather(
+        storage.set('a/1', b'4'),
+        storage.set('a/2', b'5'),
+        loop=context.loop,
+    )
+    files = [p for p, is_file in synced if is_file]
+    assert 2 == len(files)
+    assert not any(p.startswith(str(storage.raw_key('a').path)) for p in files)
+
+
+async def test_sharded_executors(context):
+    storage = context.sharded
+    assert 4 == len(set(map(id, storage._executors)))
+    assert storage._executors == storage.a._executors
+    await asyncio.gather(
+        *(storage.set(str(i), b'1') for i in range(20)),
+        loop=context.loop,
+    )
+    assert b'1' == await storage.get('7')
+    status = storage.executors_status()
+    assert 4 == len(status)
+    assert 21 <= sum(i['calls'] for i in status)
+    assert all(i['queue'] == 0 for i in status)
+
+
 async def test_chunk(context):
     storage = context.storage
     key4 = ('4', '5')
@@ -148,6 +257,105 @@ async def test_chunk(context):
     assert data == await storage.get(key4)
 
 
+async def test_stream(context):
+    storage = context.storage
+    async with storage.open_write('s/1') as writer:
+        for i in range(3):
+            await writer.write(b'[1')
+        assert await storage.get('s/1') is None
+    assert b'[1[1[1' == await storage.get('s/1')
+
+    with pytest.raises(ZeroDivisionError):
+        async with storage.open_write('s/1') as writer:
+            await writer.write(b'1')
+            1 / 0
+    assert b'[1[1[1' == await storage.get('s/1')
+    assert not list(storage._path.path.glob('**/*.tmp*'))
+
+    chunks = []
+    async with storage.open_read('s/1', 4) as reader:
+        async for chunk in reader:
+            chunks.append(chunk)
+    assert [b'[1[1', b'[1'] == chunks
+    async with storage.open_read('s/2') as reader:
+        assert reader is None
+
+    await storage.set('s/2', b'{"a": 1}')
+    assert await storage.copy('s/2', context.cas, 'x')
+    assert {'a': 1} == await context.cas.get('x')
+    assert await context.cas.copy('x', storage, 's/3')
+    assert b'{"a": 1}' == await storage.get('s/3')
+    assert not await storage.copy('s/4', context.cas, 'x')
+    assert await context.cas.get('x') is None
+
+
+async def test_expiry(context):
+    storage = context.expiring
+    await storage.set('a', b'1')
+    await storage.d.set('b', b'2')
+    await storage.set('c', b'3')
+    await storage.expiry('d/b', 0.02)
+    await storage.expiry('c', 100)
+    assert b'2' == await storage.get('d/b')
+    assert ['a', 'c', 'd'] == sorted(map(str, await storage.list()))
+
+    await asyncio.sleep(0.05, loop=context.loop)
+    assert await storage.d.get('b') is None
+    for _ in range(20):
+        if not storage._expiry._reaping:
+            break
+        await asyncio.sleep(0.01, loop=context.loop)
+    assert not storage.raw_key('d/b').path.exists()
+    assert b'1' == await storage.get('a')
+
+    await storage.set('c', b'4')
+    await storage.expiry('a', 100)
+    deadlines, _ = storage._expiry._load()
+    assert ['a'] == list(deadlines)
+    assert storage._expiry.journal == str(
+        storage.raw_key('.expiry.expiring').path.absolute())
+
+
+async def test_expiry_reap_set(context, mocker):
+    storage = context.expiring
+    await storage.set('r', b'1')
+    await storage.expiry('r', 0.01)
+    expire = storage._expire
+    reaping = threading.Event()
+
+    def slow_expire(path):
+        reaping.set()
+        time.sleep(0.05)
+        return expire(path)
+
+    mocker.patch.object(storage, '_expire', slow_expire)
+    await context.loop.run_in_executor(None, reaping.wait, 1)
+    await storage.set('r', b'2')
+    await asyncio.sleep(0.1, loop=context.loop)
+    assert b'2' == await storage.get('r')
+
+
+async def test_iter_keys(context):
+    storage = context.expiring
+    await storage.set('a', b'1')
+    await storage.set('d/e/b', b'2')
+    await storage.set('c', b'3')
+    await storage.expiry('c', 100)
+    await storage.expiry('a', -1)
+    keys = []
+    async for batch in storage.iter_keys(batch=1):
+        assert 1 == len(batch)
+        keys.extend(batch)
+    assert ['c', 'd/e/b'] == sorted(keys)
+
+    fields = context.fields
+    await fields.set('x/y', {'f': 1, 'g': 2})
+    keys = []
+    async for batch in fields.x.iter_keys():
+        keys.extend(batch)
+    assert ['y'] == keys
+
+
 class Store(FieldStorageMixin, FileSystemStorage):
     pass
 
@@ -166,6 +374,39 @@ async def test_field_storage(context):
     assert {'f': 3, 'g': 4, 'h': 6, 'z': 1} == await storage.get(key)
     await storage.set(key, None)
 
+    await asyncio.gather(
+        *(storage.set(key, i, field=str(i)) for i in range(10)),
+        loop=context.loop,
+    )
+    assert {str(i): i for i in range(10)} == await storage.get(key)
+    assert not storage._field_locks
+
+
+async def test_field_files(context):
+    storage = context.fields
+    key = ('7', '8')
+    await storage.set(key, {'f': 3, 'g': [4]})
+    assert {'f': 3, 'g': [4]} == await storage.get(key)
+    assert [4] == await storage.get(key, field='g')
+    assert b'3' == storage.raw_key(key).path.joinpath('f').read_bytes()
+
+    await asyncio.gather(
+        *(storage.set(key, i, field=str(i)) for i in range(5)),
+        loop=context.loop,
+    )
+    assert {'f': 3, '0': 0, '4': 4} == await storage.get(
+        key, fields=['f', '0', '4'])
+    with pytest.raises(KeyError):
+        await storage.get(key, field='h')
+    with pytest.raises(ValueError):
+        await storage.set(key, 1, field='../h')
+
+    await storage.set(key, {'h': 1})
+    assert {'h': 1} == await storage.get(key)
+    await storage.set(key, None)
+    assert await storage.get(key) is None
+    assert await storage.get(key, field='h') is None
+
 
 async def test_fd(context):
     storage = context.storage
@@ -200,6 +441,41 @@ async def test_fd(context):
     await storage.set('1', None)
 
 
+async def test_buffered_file(context):
+    storage = context.storage
+    k = storage.raw_key('lines')
+    lines = ['{}\n'.format(i) * (i % 7) for i in range(1000)]
+    async with k.open('w', buffer_size=100) as f:
+        for line in lines:
+            await f.write(line)
+    expected = ''.join(lines).splitlines(keepends=True)
+
+    result = []
+    async with k.open(buffer_size=64) as f:
+        async for line in f:
+            result.append(line)
+    assert expected == result
+
+    async with k.open('rb', buffer_size=64) as f:
+        assert b'1\n' == await f.readline()
+        buf = bytearray(4)
+        assert 4 == await f.readinto(buf)
+        assert b'2\n2\n' == buf
+        chunks = []
+        async for c in f.iter_chunks(1000):
+            chunks.append(c)
+        assert all(len(c) == 1000 for c in chunks[:-1])
+        assert ''.join(lines).encode()[6:] == b''.join(chunks)
+        assert b'' == await f.read()
+
+    async with k.open('r+b') as f:
+        assert b'1\n' == await f.readline()
+        await f.write(b'X')
+    async with k.open('rb') as f:
+        assert b'1\nX\n2\n' == await f.read(6)
+    await storage.set('lines', None)
+
+
 async def test_nested(context):
     storage = context.storage
     await storage.set('a/2', b'0')
@@ -39,3 +39,48 @@ async def test_format(loop):
     async with Context(config=config, loop=loop) as context:
         storage = context.storage
         assert isinstance(storage.raw_key('test'), URL)
+
+
+async def test_stream(loop, aiohttp_client, tmp_path):
+    files = {}
+
+    async def get(request):
+        if request.match_info['key'] not in files:
+            raise web.HTTPNotFound()
+        return web.Response(body=files[request.match_info['key']])
+
+    async def put(request):
+        assert request.headers['Transfer-Encoding'] == 'chunked'
+        files[request.match_info['key']] = await request.read()
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get('/{key}', get)
+    app.router.add_put('/{key}', put)
+    client = await aiohttp_client(app)
+
+    config = Config(
+        http=dict(
+            cls='aioworkers.storage.http.Storage',
+            prefix=str(client.make_url('/')),
+            format='bytes',
+            set='put',
+            conn_limit=2,
+        ),
+        fs=dict(
+            cls='aioworkers.storage.filesystem.FileSystemStorage',
+            path=str(tmp_path),
+        ),
+    )
+    async with Context(config=config, loop=loop) as context:
+        async with context.http.open_write('a') as writer:
+            await writer.write(b'1' * 10)
+            await writer.write(b'2' * 10)
+        assert b'1' * 10 + b'2' * 10 == files['a']
+
+        assert await context.http.copy('a', context.fs, 'b')
+        assert files['a'] == await context.fs.get('b')
+        assert await context.fs.copy('b', context.http, 'c')
+        assert files['a'] == files['c']
+        assert not await context.http.copy('d', context.fs, 'b')
+        assert await context.fs.get('b') is None
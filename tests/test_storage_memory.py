@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def config_yaml():
+    return """
+    lru:
+      cls: aioworkers.storage.memory.MemoryStorage
+      max_items: 2
+    lfu:
+      cls: aioworkers.storage.memory.MemoryStorage
+      max_items: 2
+      eviction: lfu
+    sized:
+      cls: aioworkers.storage.memory.MemoryStorage
+      max_size: 4
+    """
+
+
+async def test_lru(context):
+    s = context.lru
+    await s.set(1, 'a')
+    await s.set(2, 'b')
+    assert 'a' == await s.get(1)
+    await s.set(3, 'c')
+    assert await s.get(2) is None
+    assert [1, 3] == sorted(await s.list())
+    await s.set(1, None)
+    assert 1 == await s.length()
+    status = await s.status()
+    assert status['hit'] == 1
+    assert status['miss'] == 1
+    assert status['evicted'] == 1
+
+
+async def test_lfu(context):
+    s = context.lfu
+    await s.set(1, 'a')
+    await s.set(2, 'b')
+    await s.get(1)
+    await s.get(1)
+    await s.get(2)
+    await s.set(3, 'c')
+    assert await s.get(2) is None
+    assert 'a' == await s.get(1)
+    await s.set(4, 'd')
+    assert await s.get(3) is None
+    assert [1, 4] == sorted(await s.list())
+
+
+async def test_size(context):
+    s = context.sized
+    await s.set(1, b'12')
+    await s.set(2, b'34')
+    await s.set(3, b'5')
+    assert [2, 3] == sorted(await s.list())
+    await s.set(4, b'12345')
+    assert await s.get(4) is None
+    assert 3 == (await s.status())['size']
+
+
+async def test_expiry(context):
+    s = context.lru
+    await s.set(1, 'a')
+    await s.set(2, 'b')
+    await s.expiry(1, 0.01)
+    await s.expiry(2, 0.01)
+    await s.expiry(2, None)
+    assert 'a' == await s.get(1)
+    await asyncio.sleep(0.02, loop=context.loop)
+    assert await s.get(1) is None
+    assert 'b' == await s.get(2)
+    assert 1 == (await s.status())['expired']
+    await s.expiry(2, 0)
+    assert not await s.length()
@@ -1 +1,271 @@
+import asyncio
+import tempfile
+
+import pytest
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
 from aioworkers.storage import meta  # noqa
+from aioworkers.storage import StorageError
+from aioworkers.storage.memory import MemoryStorage
+
+
+class Slow(MemoryStorage):
+    async def set(self, key, value):
+        await asyncio.sleep(0.05, loop=self.loop)
+        await super().set(key, value)
+
+
+class SlowRead(MemoryStorage):
+    async def get(self, key):
+        await asyncio.sleep(0.05, loop=self.loop)
+        return await super().get(key)
+
+
+class Broken(MemoryStorage):
+    async def get(self, key):
+        raise OSError()
+
+    async def set(self, key, value):
+        raise OSError()
+
+
+@pytest.fixture
+def config_yaml():
+    return """
+    source:
+      cls: aioworkers.storage.memory.MemoryStorage
+    memory:
+      cls: aioworkers.storage.memory.MemoryStorage
+    cache:
+      cls: aioworkers.storage.meta.Cache
+      storage: memory
+      source: source
+      ttl: 10
+      negative_ttl: 10
+      refresh: 0.01
+      write_back: async
+    cache_refresh:
+      cls: aioworkers.storage.meta.Cache
+      storage: memory
+      source: source
+      refresh: 0.01
+    slow:
+      cls: tests.test_storage_meta.Slow
+    broken:
+      cls: tests.test_storage_meta.Broken
+    replicator:
+      cls: aioworkers.storage.meta.Replicator
+      storages: [broken, slow, memory]
+      w: 1
+    slow_read:
+      cls: tests.test_storage_meta.SlowRead
+    fallback:
+      cls: aioworkers.storage.meta.Fallback
+      storages: [slow_read, source]
+      hedge: 0.01
+      backfill: true
+    fallback_broken:
+      cls: aioworkers.storage.meta.Fallback
+      storages: [broken, memory]
+    m1:
+      cls: aioworkers.storage.memory.MemoryStorage
+    m2:
+      cls: aioworkers.storage.memory.MemoryStorage
+    m3:
+      cls: aioworkers.storage.memory.MemoryStorage
+    sharded:
+      cls: aioworkers.storage.meta.Sharded
+      storages: [m1, m2]
+    sharded3:
+      cls: aioworkers.storage.meta.Sharded
+      storages: [m1, m2, m3]
+    write_behind:
+      cls: aioworkers.storage.meta.WriteBehind
+      storage: m1
+      max_items: 3
+      interval: 0.01
+    quorum:
+      cls: aioworkers.storage.meta.Replicator
+      storages: [broken, memory]
+      r: 2
+    replicator_read:
+      cls: aioworkers.storage.meta.Replicator
+      storages: [slow_read, memory]
+      half_life: 0.1
+      probe: 2
+    """
+
+
+async def test_cache(context):
+    source = context.source
+    memory = context.memory
+    cache = context.cache
+    await source.set(1, 'a')
+
+    assert ['a', 'a', 'a'] == await asyncio.gather(
+        cache.get(1), cache.get(1), cache.get(1), loop=context.loop)
+    assert 1 == source.counter['hit']
+    await cache.stop()
+    assert 'a' == await memory.get(1)
+    assert memory._deadlines[1]
+
+    assert await cache.get(2) is None
+    assert await cache.get(2) is None
+    assert 1 == source.counter['miss']
+    assert await memory.get(2) is None
+
+    await source.set(1, 'b')
+    await asyncio.sleep(0.02, loop=context.loop)
+    assert 'a' == await cache.get(1)
+    await cache.stop()
+    assert 'b' == await cache.get(1)
+    assert 2 == source.counter['hit']
+
+    await cache.set(2, 'c')
+    assert 'c' == await cache.get(2)
+
+
+async def test_cache_refresh_missing(context):
+    cache = context.cache_refresh
+    assert await cache.get(1) is None
+    assert await cache.get(1) is None
+    assert 2 == context.source.counter['miss']
+    await context.source.set(1, 'a')
+    assert 'a' == await cache.get(1)
+
+
+async def test_replicator(context):
+    r = context.replicator
+    await r.set(1, 'a')
+    assert 'a' == await context.memory.get(1)
+    assert await context.slow.get(1) is None
+    assert 'broken' in r._errors
+    assert 'broken' not in r.ranked()
+    await r.stop()
+    assert 'a' == await context.slow.get(1)
+    assert not r._latency
+    assert 'a' == await r.get(1)
+    assert 'a' == await r.get(1)
+    assert {'slow', 'memory'} == set(r._latency)
+
+
+async def test_replicator_probe(context):
+    r = context.replicator_read
+    await r.set(1, 'a')
+    assert not r._latency
+    assert 'a' == await r.get(1)
+    assert r.latency('slow_read') >= 0.05
+    assert 'a' == await r.get(1)
+    assert r.ranked() == ['memory', 'slow_read']
+    await r.stop()
+    assert 2 == len(r._latency)
+
+    now = context.loop.time()
+    r._latency['memory'] = 1, now
+    assert r.ranked()[0] == 'slow_read'
+    r._latency['memory'] = 1, now - 1
+    assert r.ranked()[0] == 'memory'
+
+    r._latency['memory'] = 1, now
+    for _ in range(2):
+        assert 'a' == await r.get(1)
+    await r.stop()
+    assert r.latency('memory') < 1
+
+
+async def test_replicator_quorum(context):
+    r = context.quorum
+    with pytest.raises(StorageError):
+        await r.set(1, 'a')
+    assert 'a' == await context.memory.get(1)
+    assert 'a' == await r.get(1)
+    assert await r.get(2) is None
+
+
+async def test_fallback(context):
+    f = context.fallback
+    await context.source.set(1, 'a')
+    t = context.loop.time()
+    assert 'a' == await f.get(1)
+    assert context.loop.time() - t < 0.05
+    await f.stop()
+    assert 'a' == await context.slow_read.get(1)
+    assert await f.get(2) is None
+
+    await context.memory.set(1, 'b')
+    assert 'b' == await context.fallback_broken.get(1)
+    with pytest.raises(OSError):
+        await context.fallback_broken.get(2)
+
+
+async def test_sharded(context):
+    s = context.sharded
+    keys = list(range(100))
+    await s.set_many((k, str(k)) for k in keys)
+    assert 40 < await context.m1.length() < 60
+    assert list(map(str, keys)) == await s.get_many(keys)
+    await s.set(1, 'a')
+    assert 'a' == await s.get(1)
+
+    s3 = context.sharded3
+    moved = await s3.rebalance()
+    assert 10 < moved < 60
+    assert moved == await context.m3.length()
+    assert 100 == sum([
+        await context.m1.length(),
+        await context.m2.length(),
+        await context.m3.length(),
+    ])
+    assert 'a' == await s3.get(1)
+    assert list(map(str, keys[2:])) == await s3.get_many(keys[2:])
+
+
+async def test_sharded_rebalance_nested(loop):
+    with tempfile.TemporaryDirectory() as d:
+        fs = dict(
+            cls='aioworkers.storage.filesystem.FileSystemStorage',
+            executor=None,
+        )
+        config = Config(
+            f1=dict(fs, path=d + '/1', tmp=d),
+            f2=dict(fs, path=d + '/2', tmp=d),
+            s1=dict(cls='aioworkers.storage.meta.Sharded', storages=['f1']),
+            s2=dict(
+                cls='aioworkers.storage.meta.Sharded',
+                storages=['f1', 'f2']),
+        )
+        async with Context(config, loop=loop) as context:
+            keys = ['a/{}'.format(i) for i in range(20)]
+            await context.s1.set_many((k, b'1') for k in keys)
+            moved = await context.s2.rebalance(batch=3)
+            assert 0 < moved < 20
+            assert [b'1'] * 20 == await context.s2.get_many(keys)
+            moved_keys = [k for k in keys if context.s2.shard(k) == 'f2']
+            assert moved == len(moved_keys)
+            assert [None] * moved == await context.f1.get_many(moved_keys)
+
+    with pytest.raises(ValueError):
+        meta.Sharded(Config(name='s', storages=[]))
+
+
+async def test_write_behind(context):
+    s = context.write_behind
+    for i in range(5):
+        await s.set(1, i)
+    assert 4 == await s.get(1)
+    assert await context.m1.get(1) is None
+    await asyncio.sleep(0.02, loop=context.loop)
+    assert 4 == await context.m1.get(1)
+    await s.set(1, None)
+    assert await s.get(1) is None
+
+    for i in range(3):
+        await s.set(i, i)
+    await s.set(4, 4)
+    assert 4 == await s.get(4)
+    await s.stop()
+    assert [0, 1, 2, 4] == await context.m1.get_many([0, 1, 2, 4])
+    status = await s.status()
+    assert 5 == status['coalesced']
+    assert 0 == status['buffered']
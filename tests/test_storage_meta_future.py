@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 
@@ -15,6 +17,14 @@ def config_yaml():
         cls: aioworkers.storage.meta.FutureStorage
         weak: false
         exists_set: false
+    strong:
+        cls: aioworkers.storage.meta.FutureStorage
+        weak: false
+        max_items: 2
+        timeout: 0.01
+    weak:
+        cls: aioworkers.storage.meta.FutureStorage
+        max_items: 2
     """
 
 
@@ -37,3 +47,44 @@ async def test_2(context):
 async def test_3(context):
     await context.s3.set(1, 1)
     await context.s3.set(1, 2)
+
+
+async def test_timeout(context):
+    storage = context.strong
+    with pytest.raises(asyncio.TimeoutError):
+        await storage.get(1)
+    f = storage.get(1, timeout=1)
+    await asyncio.sleep(0, loop=context.loop)
+    assert (await storage.status())['waiters'] == 1
+    await storage.set(1, 2)
+    assert 2 == await f
+    assert 2 == await storage.get(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await storage.get_many([1, 3])
+    await storage.set(3, 4)
+    assert [2, 4] == await storage.get_many([1, 3])
+    status = await storage.status()
+    assert status['timeout'] == 2
+    assert status['waiters'] == 0
+
+
+async def test_capacity(context):
+    storage = context.strong
+    f = storage.get(1, timeout=1)
+    for i in range(2, 4):
+        await storage.set(i, i)
+    with pytest.raises(asyncio.CancelledError):
+        await f
+    status = await storage.status()
+    assert status['items'] == 2
+    assert status['evicted'] == 1
+
+    storage = context.weak
+    await storage.set(1, 1)
+    assert 1 == await storage.get(1)
+    for i in range(2, 5):
+        await storage.set(i, i)
+    assert 4 == await storage.get(4)
+    assert not storage.get(2).done()
+    assert (await storage.status())['evicted'] == 1
@@ -0,0 +1,30 @@
+import math
+import random
+
+from aioworkers.core.timer import TimerWheel
+
+
+def test_timer_wheel():
+    rnd = random.Random(0)
+    wheel = TimerWheel(resolution=1, slots=4, levels=3)
+    deadlines = {}
+    now = 0
+    for _ in range(2000):
+        key = rnd.randrange(100)
+        action = rnd.random()
+        if action < 0.5:
+            deadline = now + rnd.uniform(-2, 200)
+            wheel.add(key, deadline)
+            deadlines[key] = deadline
+        elif action < 0.6:
+            assert deadlines.pop(key, None) == wheel.remove(key)
+        else:
+            now += rnd.uniform(0, 30)
+            expected = {
+                k for k, d in deadlines.items()
+                if math.ceil(d) <= math.floor(now)
+            }
+            assert expected == set(wheel.advance(now))
+            for k in expected:
+                del deadlines[k]
+        assert len(deadlines) == len(wheel)
@@ -76,3 +76,157 @@ async def test_set_context(loop):
         worker.set_config(config)
     with pytest.raises(RuntimeError):
         worker.set_context(context)
+
+
+async def test_batch(loop, mocker):
+    batches = []
+
+    async def myrun(worker, values):
+        batches.append(values)
+        return [v * 2 for v in values]
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q_in=dict(cls='aioworkers.queue.base.Queue'),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q_in', output='q_out',
+            batch=dict(size=3, timeout=0.01),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q_in.put_many(range(5))
+        result = []
+        while len(result) < 5:
+            result.append(await context.q_out.get())
+        assert [0, 2, 4, 6, 8] == result
+        assert [[0, 1, 2], [3, 4]] == batches
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+async def test_concurrency(loop, mocker, ordered):
+    running = []
+
+    async def myrun(worker, value):
+        running.append(len(worker._inflight))
+        await asyncio.sleep(0.01 * (5 - value), loop=loop)
+        if value == 3:
+            raise ValueError(value)
+        return value
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q_in=dict(cls='aioworkers.queue.base.Queue'),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q_in', output='q_out',
+            concurrency=5, ordered=ordered,
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        worker = context.w
+        await context.q_in.put_many(range(5))
+        await asyncio.sleep(0.001, loop=loop)
+        assert 5 == (await worker.status())['inflight']
+        await worker.stop(force=False)
+        assert not worker.running()
+        result = [context.q_out.get_nowait() for _ in range(4)]
+        if ordered:
+            assert [0, 1, 2, 4] == result
+        else:
+            assert [4, 2, 1, 0] == result
+        assert 5 == max(running)
+        status = await worker.status()
+        assert status['run'] == 5
+        assert status['done'] == 4
+        assert status['error'] == 1
+        assert status['inflight'] == 0
+
+        worker._persist = True
+        await worker.start()
+        await asyncio.sleep(0.001, loop=loop)
+        assert worker._getting is not None
+        await asyncio.wait_for(worker.stop(force=False), 1, loop=loop)
+        assert context.q_in.empty()
+
+
+async def test_retry(loop, mocker):
+    seen = []
+
+    async def myrun(worker, value):
+        seen.append(value)
+        if value == 3 or value == 2 and seen.count(2) < 3:
+            raise ValueError(value)
+        return value
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q_in=dict(cls='aioworkers.queue.base.Queue'),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        q_dead=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q_in', output='q_out',
+            retry=dict(
+                attempts=3, delay=0.01, factor=2, max_delay=0.015,
+                dead_letter='q_dead',
+            ),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q_in.put_many(range(4))
+        result = []
+        while len(result) < 3:
+            result.append(await context.q_out.get())
+        assert [0, 1, 2] == sorted(result)
+        assert 3 == await asyncio.wait_for(
+            context.q_dead.get(), 1, loop=loop)
+        assert 3 == seen.count(3)
+        status = await context.w.status()
+        assert status['retry'] == 4
+        assert status['dead_letter'] == 1
+        assert status['error'] == 5
+        assert status['retries'] == 0
+
+
+async def test_retry_stop(loop, mocker):
+    seen = []
+
+    async def myrun(worker, value):
+        seen.append(value)
+        if seen.count(value) == 1:
+            raise ValueError(value)
+        await asyncio.sleep(0.05, loop=loop)
+        return value
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q_in=dict(cls='aioworkers.queue.base.Queue'),
+        q_out=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q_in', output='q_out',
+            concurrency=2, retry=dict(delay=0.01),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        await context.q_in.put(1)
+        await asyncio.sleep(0.02, loop=loop)
+        await context.q_in.put(2)
+        await asyncio.sleep(0.015, loop=loop)
+        await asyncio.wait_for(context.w.stop(force=False), 1, loop=loop)
+        assert 1 == context.q_out.get_nowait()
+        status = await context.w.status()
+        assert status['retry_dropped'] == 1
+        assert status['retries'] == 0
+        assert [1, 1, 2] == seen
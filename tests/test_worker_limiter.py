@@ -0,0 +1,78 @@
+import asyncio
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+from aioworkers.worker.limiter import AdaptiveLimiter, Limiter
+
+
+async def test_limiter(loop):
+    limiter = Limiter(2, loop=loop)
+    await limiter.acquire()
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire(), loop=loop)
+    cancelled = asyncio.ensure_future(limiter.acquire(), loop=loop)
+    await asyncio.sleep(0, loop=loop)
+    cancelled.cancel()
+    limiter.release()
+    await waiter
+    assert 2 == limiter.inflight
+    limiter.release()
+    limiter.release()
+    assert 0 == limiter.inflight
+
+
+def test_adaptive():
+    limiter = AdaptiveLimiter(10, min_limit=2, max_limit=20)
+    for _ in range(100):
+        limiter.update(0.1, False)
+    assert 15 < limiter.limit <= 20
+    top = limiter.limit
+    for _ in range(40):
+        limiter.update(1, False)
+    assert limiter.limit < top * 0.9
+    for _ in range(300):
+        limiter.update(1, True)
+    assert 2 == limiter.limit
+    for _ in range(20):
+        limiter.update(1, False)
+    assert 2 < limiter.limit
+
+
+async def test_adaptive_release(loop):
+    limiter = AdaptiveLimiter(4, loop=loop)
+    for _ in range(3):
+        await limiter.acquire()
+        limiter.release()
+    assert 4 == limiter.limit
+    assert 4 == limiter._since_decrease
+    assert 0 == limiter.inflight
+
+
+async def test_worker_adaptive(loop, mocker):
+    delay = {'value': 0.001}
+
+    async def myrun(worker, value):
+        await asyncio.sleep(delay['value'], loop=loop)
+
+    mocker.patch('aioworkers.worker.base.import_name',
+                 lambda x: myrun)
+
+    config = Config(
+        q=dict(cls='aioworkers.queue.base.Queue'),
+        w=dict(
+            cls='aioworkers.worker.base.Worker', autorun=True,
+            run='mocked.run', input='q',
+            concurrency=8, adaptive=dict(min=2),
+        ),
+    )
+    async with Context(config, loop=loop) as context:
+        worker = context.w
+        await context.q.put_many(range(50))
+        while not context.q.empty():
+            await asyncio.sleep(0.01, loop=loop)
+        assert 8 == (await worker.status())['limit']
+        delay['value'] = 0.02
+        await context.q.put_many(range(50))
+        while not context.q.empty():
+            await asyncio.sleep(0.01, loop=loop)
+        assert 8 > (await worker.status())['limit']
@@ -32,3 +32,30 @@ async def test_super_crash(loop):
         ctx.sv._children[0]._future.cancel()
         await ctx.q1.put(1)
         await ctx.q2.get()
+
+
+async def test_super_rate(loop):
+    async with Context(config.super.rate, loop=loop) as ctx:
+        await ctx.q1.put_many(range(10))
+        started = loop.time()
+        for _ in range(10):
+            await ctx.q2.get()
+        assert loop.time() - started >= 0.08
+
+
+async def test_super_stop_rate(loop):
+    async with Context(config.super.rate, loop=loop) as ctx:
+        sv = ctx.sv
+        bucket = sv._bucket
+        child = sv._children[0]
+        stop = child.stop
+        seen = []
+
+        async def child_stop(force=True):
+            seen.append(sv._bucket is bucket)
+            await stop(force=force)
+
+        child.stop = child_stop
+        await sv.stop(force=True)
+        assert [True] == seen
+        assert sv._bucket is None